@@ -1,12 +1,17 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple, Dict, Any, List
+from cachetools import TLRUCache
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorClient
 from models import User, UserInDB, TokenData
+from metrics import registry, password_hash_duration
 from dotenv import load_dotenv
 from pathlib import Path
 import logging
@@ -28,6 +33,23 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "
 
 logger.info(f"JWT SECRET_KEY loaded: {'Yes' if SECRET_KEY != 'fallback_secret_key' else 'No'}")
 
+# Authenticated principal cache: token -> (user, exp), never outliving the token's exp
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+principal_cache = TLRUCache(
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")),
+    ttu=lambda token, principal, now: min(now + PRINCIPAL_CACHE_TTL, principal[1]),
+    timer=time.time
+)
+
+def get_cached_principal(token: str) -> Optional[User]:
+    """Get the cached user for a token, if still valid."""
+    principal: Optional[Tuple[User, float]] = principal_cache.get(token)
+    return principal[0] if principal else None
+
+def cache_principal(token: str, user: User, exp: Optional[float] = None):
+    """Cache the user behind a validated token until its exp."""
+    principal_cache[token] = (user, exp if exp is not None else time.time() + PRINCIPAL_CACHE_TTL)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -36,6 +58,78 @@ def get_password_hash(password: str) -> str:
     """Hash a password."""
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """Runs bcrypt off the event loop on a bounded worker pool."""
+
+    def __init__(self, workers: int, max_queue: int):
+        # bcrypt releases the GIL, so threads give real parallelism here
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.workers = workers
+        self.max_pending = workers + max_queue
+        self.pending = 0
+        self.rejected = 0
+        self.latency = password_hash_duration
+        registry.collector(self.render_metrics)
+    
+    async def _run(self, operation: str, func, *args):
+        """Run a bcrypt call on the pool, rejecting with 503 when saturated."""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, please retry",
+                headers={"Retry-After": "1"}
+            )
+        
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+            self.latency.observe((operation,), time.perf_counter() - start)
+    
+    async def hash(self, password: str) -> str:
+        """Hash a password on the worker pool."""
+        return await self._run("hash", get_password_hash, password)
+    
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password on the worker pool."""
+        return await self._run("verify", verify_password, plain_password, hashed_password)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool and latency statistics."""
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "latency_seconds": {labels[0]: hist.snapshot() for labels, hist in list(self.latency.series.items())}
+        }
+    
+    def render_metrics(self) -> List[str]:
+        """Render the pool's queue depth and rejections for /metrics."""
+        return [
+            "# HELP password_hash_pending bcrypt calls running or queued on the worker pool",
+            "# TYPE password_hash_pending gauge",
+            f"password_hash_pending {self.pending}",
+            "# HELP password_hash_max_pending Pool capacity before calls are rejected",
+            "# TYPE password_hash_max_pending gauge",
+            f"password_hash_max_pending {self.max_pending}",
+            "# HELP password_hash_rejected_total bcrypt calls rejected with 503 because the pool was full",
+            "# TYPE password_hash_rejected_total counter",
+            f"password_hash_rejected_total {self.rejected}"
+        ]
+    
+    def shutdown(self):
+        """Stop the worker pool."""
+        self.executor.shutdown(wait=False)
+
+password_hasher = PasswordHasher(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", "4")),
+    max_queue=int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token."""
     to_encode = data.copy()
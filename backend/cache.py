@@ -0,0 +1,224 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Tuple
+from dotenv import load_dotenv
+from pathlib import Path
+import os
+import time
+import logging
+import orjson
+
+from database import db_service
+from metrics import get_cache_stats
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env', override=True)
+
+logger = logging.getLogger(__name__)
+
+# Per-namespace TTLs in seconds
+NAMESPACE_TTLS = {
+    "tmdb_lists": int(os.getenv("CACHE_TTL_TMDB_LISTS", "3600")),
+    "tmdb_details": int(os.getenv("CACHE_TTL_METADATA", "86400")),
+    "tmdb_genres": int(os.getenv("CACHE_TTL_TMDB_GENRES", "604800")),
+    "streams": int(os.getenv("CACHE_TTL_STREAMS", "3600")),
+}
+DEFAULT_TTL = 3600
+
+CACHE_L1_MAX_BYTES = int(os.getenv("CACHE_L1_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_L2_BACKEND = os.getenv("CACHE_L2_BACKEND", "mongo")  # mongo, local or none
+
+class LocalCache:
+    """Bounded in-process LRU cache with per-entry TTLs and byte-size accounting."""
+    
+    def __init__(self, max_bytes: int = CACHE_L1_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        # key -> (value, expires_at, size, namespace)
+        self.entries: "OrderedDict[str, Tuple[Any, float, int, str]]" = OrderedDict()
+        self.stats = get_cache_stats("l1")
+    
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Get a value, refreshing its LRU position."""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats.incr(namespace, "misses")
+            return None
+        
+        if entry[1] <= time.monotonic():
+            self._remove(key)
+            self.stats.incr(namespace, "expirations")
+            self.stats.incr(namespace, "misses")
+            return None
+        
+        self.entries.move_to_end(key)
+        self.stats.incr(namespace, "hits")
+        return entry[0]
+    
+    def set(self, namespace: str, key: str, value: Any, size: int, ttl: float):
+        """Store a value, evicting least recently used entries to stay under max_bytes."""
+        if size > self.max_bytes:
+            return
+        
+        if key in self.entries:
+            self._remove(key)
+        
+        while self.entries and self.size_bytes + size > self.max_bytes:
+            evicted_key, evicted = next(iter(self.entries.items()))
+            self._remove(evicted_key)
+            self.stats.incr(evicted[3], "evictions")
+        
+        self.entries[key] = (value, time.monotonic() + ttl, size, namespace)
+        self.size_bytes += size
+    
+    def _remove(self, key: str):
+        entry = self.entries.pop(key)
+        self.size_bytes -= entry[2]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get size and counters."""
+        return {
+            "entries": len(self.entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "namespaces": self.stats.snapshot()
+        }
+
+class LocalBackend:
+    """Process-local L2 stand-in, for tests and single-worker setups."""
+    
+    def __init__(self):
+        self.entries: Dict[str, Tuple[bytes, datetime]] = {}
+    
+    async def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Get (serialized value, remaining ttl) for a key."""
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+        
+        remaining = (entry[1] - datetime.utcnow()).total_seconds()
+        if remaining <= 0:
+            del self.entries[key]
+            return None
+        return entry[0], remaining
+    
+    async def set(self, namespace: str, key: str, data: bytes, ttl: float):
+        """Store a serialized value."""
+        self.entries[key] = (data, datetime.utcnow() + timedelta(seconds=ttl))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get backend size."""
+        return {
+            "backend": "local",
+            "entries": len(self.entries),
+            "size_bytes": sum(len(data) for data, _ in self.entries.values())
+        }
+
+class MongoBackend:
+    """L2 shared by every worker, stored in the cache_entries collection."""
+    
+    def _collection(self):
+        # The database connects at startup; until then L2 is skipped
+        return db_service.db.cache_entries if db_service.db is not None else None
+    
+    async def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Get (serialized value, remaining ttl) for a key."""
+        collection = self._collection()
+        if collection is None:
+            return None
+        
+        now = datetime.utcnow()
+        doc = await collection.find_one({"_id": key, "expires_at": {"$gt": now}}, {"data": 1, "expires_at": 1})
+        if not doc:
+            return None
+        return doc["data"], (doc["expires_at"] - now).total_seconds()
+    
+    async def set(self, namespace: str, key: str, data: bytes, ttl: float):
+        """Store a serialized value."""
+        collection = self._collection()
+        if collection is None:
+            return
+        
+        await collection.update_one(
+            {"_id": key},
+            {"$set": {
+                "namespace": namespace,
+                "data": data,
+                "size": len(data),
+                "expires_at": datetime.utcnow() + timedelta(seconds=ttl)
+            }},
+            upsert=True
+        )
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get backend name; sizes live in Mongo."""
+        return {"backend": "mongo"}
+
+class TwoTierCache:
+    """In-process L1 in front of a shared L2, with per-namespace TTLs."""
+    
+    def __init__(self, l1: LocalCache, l2=None):
+        self.l1 = l1
+        self.l2 = l2
+        self.l2_stats = get_cache_stats("l2")
+    
+    def ttl(self, namespace: str) -> int:
+        """Get the TTL for a namespace."""
+        return NAMESPACE_TTLS.get(namespace, DEFAULT_TTL)
+    
+    def get_local(self, namespace: str, key: str) -> Optional[Any]:
+        """Get a value from L1 only."""
+        return self.l1.get(namespace, key)
+    
+    async def get_shared(self, namespace: str, key: str) -> Optional[Any]:
+        """Get a value from L2, copying hits into L1."""
+        if not self.l2:
+            return None
+        
+        start = time.perf_counter()
+        try:
+            entry = await self.l2.get(key)
+        except Exception as e:
+            logger.error(f"L2 cache read failed: {str(e)}")
+            entry = None
+        self.l2_stats.observe(namespace, time.perf_counter() - start)
+        
+        if entry is None:
+            self.l2_stats.incr(namespace, "misses")
+            return None
+        
+        self.l2_stats.incr(namespace, "hits")
+        data, remaining = entry
+        value = orjson.loads(data)
+        self.l1.set(namespace, key, value, len(data), min(remaining, self.ttl(namespace)))
+        return value
+    
+    async def set(self, namespace: str, key: str, value: Any):
+        """Store a value in both tiers, sized by its serialized bytes."""
+        data = orjson.dumps(value, default=str)
+        ttl = self.ttl(namespace)
+        self.l1.set(namespace, key, value, len(data), ttl)
+        
+        if self.l2:
+            try:
+                await self.l2.set(namespace, key, data, ttl)
+            except Exception as e:
+                logger.error(f"L2 cache write failed: {str(e)}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get statistics for both tiers."""
+        return {
+            "l1": self.l1.get_stats(),
+            "l2": {**(self.l2.get_stats() if self.l2 else {"backend": "none"}), "namespaces": self.l2_stats.snapshot()}
+        }
+
+def create_l2_backend(name: str = CACHE_L2_BACKEND):
+    """Create the configured L2 backend."""
+    if name == "mongo":
+        return MongoBackend()
+    if name == "local":
+        return LocalBackend()
+    return None
+
+response_cache = TwoTierCache(LocalCache(), create_l2_backend())
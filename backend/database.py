@@ -1,23 +1,113 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, ReturnDocument, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from datetime import datetime, timedelta
+from bson import ObjectId
+import asyncio
+import base64
+import json
 import os
-from typing import List, Optional, Dict, Any
-from models import MovieMetadata, StreamResponse, User, WatchHistoryItem, FavoriteItem
+import threading
+import time
+from typing import List, Optional, Dict, Any, Tuple, Type, Callable
+from cachetools import LRUCache
+from models import MovieMetadata, StreamResponse, User, MovieCard, FavoriteCard, WatchHistoryCard, card_projection
+from metrics import get_cache_stats, cache_stats, hit_rate, mongo_command_duration, METRICS_ENABLED, CACHE_COUNTERS, CACHE_LATENCY_BUCKETS
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Batched last_login writes: at most one per user per throttle window, flushed periodically
+USER_ACTIVITY_FLUSH_SECONDS = float(os.getenv("USER_ACTIVITY_FLUSH_SECONDS", "30"))
+USER_ACTIVITY_THROTTLE_SECONDS = int(os.getenv("USER_ACTIVITY_THROTTLE_SECONDS", "300"))
+
+# Movie metadata cache: serve expired docs while refreshing them in the background,
+# until they are older than the hard-stale ceiling
+MOVIE_CACHE_STALE_WHILE_REVALIDATE = os.getenv("MOVIE_CACHE_STALE_WHILE_REVALIDATE", "True").lower() == "true"
+MOVIE_CACHE_HARD_STALE_HOURS = int(os.getenv("MOVIE_CACHE_HARD_STALE_HOURS", "72"))
+MOVIE_CACHE_MAX_STALE = timedelta(hours=MOVIE_CACHE_HARD_STALE_HOURS) if MOVIE_CACHE_STALE_WHILE_REVALIDATE else None
+
+def movie_stale_cutoff(now: datetime) -> datetime:
+    """Get the expiry before which a movie doc is too stale to serve."""
+    return now - MOVIE_CACHE_MAX_STALE if MOVIE_CACHE_MAX_STALE else now
+
+# Cache metrics are merged across workers in the cache_metrics collection
+CACHE_METRICS_FLUSH_SECONDS = float(os.getenv("CACHE_METRICS_FLUSH_SECONDS", "30"))
+
+# Lookups against the movies and streams collections
+mongo_cache_stats = get_cache_stats("mongo")
+
+class CommandTimer(monitoring.CommandListener):
+    """Records MongoDB command latency; only registered on the client when metrics are enabled."""
+    
+    def __init__(self):
+        # (connection, request id) -> (command, collection) until the reply arrives
+        self.commands: Dict[Tuple[Any, int], Tuple[str, str]] = {}
+        # pymongo calls listeners from motor's worker threads
+        self.lock = threading.Lock()
+    
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self.commands[(event.connection_id, event.request_id)] = (
+            event.command_name, collection if isinstance(collection, str) else ""
+        )
+    
+    def _record(self, event, outcome: str):
+        command = self.commands.pop((event.connection_id, event.request_id), None)
+        if command:
+            with self.lock:
+                mongo_command_duration.observe(command + (outcome,), event.duration_micros / 1e6)
+    
+    def succeeded(self, event):
+        self._record(event, "success")
+    
+    def failed(self, event):
+        self._record(event, "failure")
+
+def encode_cursor(sort_value: Any, doc_id: ObjectId) -> str:
+    """Encode the last (sort key, _id) of a page as an opaque cursor."""
+    if isinstance(sort_value, datetime):
+        payload = {"d": sort_value.isoformat(), "i": str(doc_id)}
+    else:
+        payload = {"v": sort_value, "i": str(doc_id)}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Any, ObjectId]:
+    """Decode a cursor from encode_cursor, raising ValueError if it is malformed."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        sort_value = datetime.fromisoformat(payload["d"]) if "d" in payload else payload["v"]
+        return sort_value, ObjectId(payload["i"])
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
 class DatabaseService:
     def __init__(self):
         self.mongo_url = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-        self.db_name = os.getenv("DB_NAME", "onstream")
+        # .env is loaded with override=True and sets DB_NAME, so a throwaway database
+        # (backend_test.py --start-backend) is passed as DB_NAME_OVERRIDE instead
+        self.db_name = os.getenv("DB_NAME_OVERRIDE") or os.getenv("DB_NAME", "onstream")
         self.client = None
         self.db = None
+        # In-memory mirror of the media_types collection
+        self.media_types = LRUCache(maxsize=int(os.getenv("MEDIA_TYPE_CACHE_SIZE", "100000")))
+        # Coalesced last_login updates waiting to be flushed
+        self.pending_activity: Dict[str, datetime] = {}
+        self.recorded_activity = LRUCache(maxsize=int(os.getenv("USER_ACTIVITY_CACHE_SIZE", "100000")))
+        self.activity_task: Optional[asyncio.Task] = None
+        self.cache_metrics_task: Optional[asyncio.Task] = None
+        # Called with the movie docs of every cache_movie/cache_movies_bulk write
+        self.movie_write_hooks: List[Callable[[List[Dict[str, Any]]], None]] = []
+        # Called with the tmdb_ids clear_expired_cache deleted and its expiry cutoff
+        self.movie_delete_hooks: List[Callable[[List[int], datetime], None]] = []
     
     async def connect(self):
         """Connect to MongoDB."""
         try:
-            self.client = AsyncIOMotorClient(self.mongo_url)
+            self.client = AsyncIOMotorClient(
+                self.mongo_url,
+                event_listeners=[CommandTimer()] if METRICS_ENABLED else None
+            )
             self.db = self.client[self.db_name]
             
             # Test connection
@@ -47,8 +137,15 @@ class DatabaseService:
             await self.db.movies.create_index("tmdb_id", unique=True)
             await self.db.movies.create_index("type")
             await self.db.movies.create_index("expires_at")
+            await self.db.movies.create_index([("popularity", -1), ("_id", -1)])
             await self.db.movies.create_index([("title", "text"), ("overview", "text")])
             
+            # Media type resolution index
+            await self.db.media_types.create_index("tmdb_id", unique=True)
+            
+            # Shared response cache (L2), expired by a TTL index
+            await self.db.cache_entries.create_index("expires_at", expireAfterSeconds=0)
+            
             # Streams collection indexes
             await self.db.streams.create_index("tmdb_id")
             await self.db.streams.create_index("expires_at")
@@ -56,22 +153,78 @@ class DatabaseService:
             # Watch history indexes
             await self.db.watch_history.create_index([("username", 1), ("tmdb_id", 1)])
             await self.db.watch_history.create_index("username")
+            await self.db.watch_history.create_index([("username", 1), ("watched_at", -1), ("_id", -1)])
+            await self.db.watch_history.create_index("watched_at")
             
             # Favorites indexes
             await self.db.favorites.create_index([("username", 1), ("tmdb_id", 1)], unique=True)
             await self.db.favorites.create_index("username")
+            await self.db.favorites.create_index([("username", 1), ("added_at", -1), ("_id", -1)])
             
             logger.info("Database indexes created successfully")
             
         except Exception as e:
             logger.error(f"Error creating indexes: {str(e)}")
     
-    # Movie/TV Methods
-    async def cache_movie(self, movie_data: Dict[str, Any], cache_hours: int = 24) -> MovieMetadata:
-        """Cache movie/TV metadata."""
-        expires_at = datetime.utcnow() + timedelta(hours=cache_hours)
+    # Pagination
+    async def _paginate(
+        self,
+        collection,
+        query: Dict[str, Any],
+        sort_key: str,
+        card: Type,
+        page: int = 1,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        include_total: bool = True
+    ) -> Dict[str, Any]:
+        """Page through a collection sorted by (sort_key, _id) descending.
+        
+        With a cursor, pages by keyset instead of skip so deep pages cost the
+        same as the first one. The total count is only run when include_total.
+        Only the card's fields are fetched, and rows are built with card.from_doc.
+        """
+        page_query = dict(query)
+        if cursor:
+            sort_value, last_id = decode_cursor(cursor)
+            page_query["$or"] = [
+                {sort_key: {"$lt": sort_value}},
+                {sort_key: sort_value, "_id": {"$lt": last_id}}
+            ]
+        
+        projection = {**card_projection(card), sort_key: 1}
+        docs_cursor = collection.find(page_query, projection).sort([(sort_key, -1), ("_id", -1)])
+        if not cursor:
+            docs_cursor = docs_cursor.skip((page - 1) * limit)
+        
+        # Fetch one extra doc to know whether there is a next page
+        docs = await docs_cursor.limit(limit + 1).to_list(length=limit + 1)
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = encode_cursor(docs[-1].get(sort_key), docs[-1]["_id"])
+        
+        results = [card.from_doc(doc) for doc in docs]
+        
+        response = {
+            "page": page,
+            "total_pages": None,
+            "total_results": None,
+            "results": results,
+            "next_cursor": next_cursor
+        }
+        
+        if include_total:
+            total_count = await collection.count_documents(query)
+            response["total_pages"] = (total_count // limit) + (1 if total_count % limit else 0)
+            response["total_results"] = total_count
         
-        movie_doc = {
+        return response
+    
+    # Movie/TV Methods
+    def _build_movie_doc(self, movie_data: Dict[str, Any], expires_at: datetime) -> Dict[str, Any]:
+        """Build the movies collection document for TMDB data."""
+        return {
             "tmdb_id": movie_data["id"],
             "title": movie_data.get("title") or movie_data.get("name", ""),
             "overview": movie_data.get("overview", ""),
@@ -85,45 +238,193 @@ class DatabaseService:
             "runtime": movie_data.get("runtime"),
             "number_of_seasons": movie_data.get("number_of_seasons"),
             "number_of_episodes": movie_data.get("number_of_episodes"),
-            "type": "tv" if "first_air_date" in movie_data else "movie",
+            "type": movie_data.get("type") or ("tv" if "first_air_date" in movie_data else "movie"),
             "adult": movie_data.get("adult", False),
             "original_language": movie_data.get("original_language", "en"),
             "popularity": movie_data.get("popularity", 0.0),
             "cached_at": datetime.utcnow(),
             "expires_at": expires_at
         }
+    
+    def _notify_movie_writes(self, movie_docs: List[Dict[str, Any]]):
+        """Pass written movie docs to the registered hooks."""
+        for hook in self.movie_write_hooks:
+            try:
+                hook(movie_docs)
+            except Exception as e:
+                logger.error(f"Movie write hook failed: {str(e)}")
+    
+    def _notify_movie_deletes(self, tmdb_ids: List[int], cutoff: datetime):
+        """Pass deleted movie ids to the registered hooks."""
+        for hook in self.movie_delete_hooks:
+            try:
+                hook(tmdb_ids, cutoff)
+            except Exception as e:
+                logger.error(f"Movie delete hook failed: {str(e)}")
+    
+    async def cache_movie(self, movie_data: Dict[str, Any], cache_hours: int = 24) -> MovieMetadata:
+        """Cache movie/TV metadata."""
+        expires_at = datetime.utcnow() + timedelta(hours=cache_hours)
+        movie_doc = self._build_movie_doc(movie_data, expires_at)
         
-        # Upsert movie data
-        result = await self.db.movies.update_one(
+        # Upsert movie data and get the database ID in the same round trip
+        result = await self.db.movies.find_one_and_update(
             {"tmdb_id": movie_data["id"]},
             {"$set": movie_doc},
-            upsert=True
+            projection={"_id": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
         )
-        
-        # Add the database ID for return object
-        if result.upserted_id:
-            movie_doc["_id"] = str(result.upserted_id)
-        else:
-            # Get existing doc ID
-            existing = await self.db.movies.find_one({"tmdb_id": movie_data["id"]})
-            if existing:
-                movie_doc["_id"] = str(existing["_id"])
+        movie_doc["_id"] = str(result["_id"])
+        self._notify_movie_writes([movie_doc])
         
         return MovieMetadata(**movie_doc)
     
-    async def get_cached_movie(self, tmdb_id: int) -> Optional[MovieMetadata]:
-        """Get cached movie/TV metadata."""
+    async def cache_movies_bulk(
+        self,
+        movies_data: List[Dict[str, Any]],
+        cache_hours: int = 24,
+        known_ids: Optional[Dict[int, str]] = None,
+        read_missing_ids: bool = False
+    ) -> Dict[int, str]:
+        """Cache many movies/TV shows with one unordered bulk upsert.
+        
+        Returns a tmdb_id -> _id map for every written document whose _id is
+        known: newly inserted ones, plus existing ones the caller passes in
+        known_ids (e.g. from an earlier read). Nothing is re-read unless
+        read_missing_ids is set, which fetches just the _ids still missing.
+        """
+        expires_at = datetime.utcnow() + timedelta(hours=cache_hours)
+        
+        # Deduplicate by tmdb_id so one batch never upserts the same doc twice
+        movie_docs = {}
+        for movie_data in movies_data:
+            movie_docs[movie_data["id"]] = self._build_movie_doc(movie_data, expires_at)
+        
+        if not movie_docs:
+            return {}
+        
+        tmdb_ids = list(movie_docs.keys())
+        operations = [
+            UpdateOne({"tmdb_id": tmdb_id}, {"$set": movie_doc}, upsert=True)
+            for tmdb_id, movie_doc in movie_docs.items()
+        ]
+        
+        try:
+            result = await self.db.movies.bulk_write(operations, ordered=False)
+            upserted = result.upserted_ids
+        except BulkWriteError as e:
+            # Concurrent upserts of the same title can race on the unique index
+            logger.warning(f"Bulk movie cache had {len(e.details.get('writeErrors', []))} write errors")
+            upserted = {item["index"]: item["_id"] for item in e.details.get("upserted", [])}
+        
+        written_ids = {tmdb_id: _id for tmdb_id, _id in (known_ids or {}).items() if tmdb_id in movie_docs}
+        written_ids.update({tmdb_ids[index]: str(_id) for index, _id in upserted.items()})
+        missing = [tmdb_id for tmdb_id in tmdb_ids if tmdb_id not in written_ids]
+        if read_missing_ids and missing:
+            async for movie_doc in self.db.movies.find({"tmdb_id": {"$in": missing}}, {"_id": 1, "tmdb_id": 1}):
+                written_ids[movie_doc["tmdb_id"]] = str(movie_doc["_id"])
+        for tmdb_id, movie_doc in movie_docs.items():
+            if tmdb_id in written_ids:
+                movie_doc["_id"] = written_ids[tmdb_id]
+        self._notify_movie_writes(list(movie_docs.values()))
+        
+        return written_ids
+    
+    async def get_cached_movie(self, tmdb_id: int, max_stale: Optional[timedelta] = None) -> Optional[MovieMetadata]:
+        """Get cached movie/TV metadata.
+        
+        With max_stale, docs that expired less than max_stale ago are returned
+        too; callers can spot them by their past expires_at.
+        """
+        now = datetime.utcnow()
+        cutoff = now - max_stale if max_stale else now
+        
+        start = time.perf_counter()
         movie_doc = await self.db.movies.find_one({
             "tmdb_id": tmdb_id,
-            "expires_at": {"$gt": datetime.utcnow()}
+            "expires_at": {"$gt": cutoff}
         })
+        mongo_cache_stats.observe("movies", time.perf_counter() - start)
         
         if movie_doc:
+            mongo_cache_stats.incr("movies", "hits")
+            if movie_doc["expires_at"] <= now:
+                mongo_cache_stats.incr("movies", "stale")
+            
             # Convert ObjectId to string
             movie_doc["_id"] = str(movie_doc["_id"])
             return MovieMetadata(**movie_doc)
+        
+        mongo_cache_stats.incr("movies", "misses")
         return None
     
+    async def get_cached_movies(
+        self,
+        tmdb_ids: List[int],
+        max_stale: Optional[timedelta] = None,
+        record_stats: bool = True,
+        doc_ids: Optional[Dict[int, str]] = None
+    ) -> Dict[int, MovieMetadata]:
+        """Get cached metadata for many ids with one $in query, keyed by tmdb_id.
+        
+        max_stale works as in get_cached_movie; missing ids are absent from the
+        result. Pass record_stats=False for re-reads that aren't cache lookups.
+        If doc_ids is given, it is filled with the _id of every doc found, even
+        ones too stale to return, so a later cache_movies_bulk can reuse them.
+        """
+        now = datetime.utcnow()
+        cutoff = now - max_stale if max_stale else now
+        
+        start = time.perf_counter()
+        query = {"tmdb_id": {"$in": tmdb_ids}}
+        if doc_ids is None:
+            query["expires_at"] = {"$gt": cutoff}
+        movie_docs = await self.db.movies.find(query).to_list(length=len(tmdb_ids))
+        
+        movies = {}
+        for movie_doc in movie_docs:
+            movie_doc["_id"] = str(movie_doc["_id"])
+            if doc_ids is not None:
+                doc_ids[movie_doc["tmdb_id"]] = movie_doc["_id"]
+                if movie_doc["expires_at"] <= cutoff:
+                    continue
+            movies[movie_doc["tmdb_id"]] = MovieMetadata(**movie_doc)
+        
+        if record_stats:
+            mongo_cache_stats.observe("movies", time.perf_counter() - start)
+            mongo_cache_stats.incr("movies", "hits", len(movies))
+            mongo_cache_stats.incr("movies", "stale", sum(1 for movie in movies.values() if movie.expires_at <= now))
+            mongo_cache_stats.incr("movies", "misses", len(set(tmdb_ids)) - len(movies))
+        return movies
+    
+    async def get_media_type(self, tmdb_id: int) -> Optional[str]:
+        """Get the resolved TMDB media type ("movie" or "tv") for an id."""
+        media_type = self.media_types.get(tmdb_id)
+        if media_type:
+            return media_type
+        
+        doc = await self.db.media_types.find_one({"tmdb_id": tmdb_id}, {"type": 1})
+        if doc:
+            self.media_types[tmdb_id] = doc["type"]
+            return doc["type"]
+        return None
+    
+    async def set_media_type(self, tmdb_id: int, media_type: str):
+        """Remember the TMDB media type for an id."""
+        if self.media_types.get(tmdb_id) == media_type:
+            return
+        
+        self.media_types[tmdb_id] = media_type
+        try:
+            await self.db.media_types.update_one(
+                {"tmdb_id": tmdb_id},
+                {"$set": {"tmdb_id": tmdb_id, "type": media_type, "resolved_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Error saving media type: {str(e)}")
+    
     async def cache_streams(self, tmdb_id: int, sources: List[Dict], cache_hours: int = 1) -> StreamResponse:
         """Cache streaming sources."""
         expires_at = datetime.utcnow() + timedelta(hours=cache_hours)
@@ -136,29 +437,27 @@ class DatabaseService:
             "expires_at": expires_at
         }
         
-        result = await self.db.streams.update_one(
+        # Upsert stream data and get the database ID in the same round trip
+        result = await self.db.streams.find_one_and_update(
             {"tmdb_id": tmdb_id},
             {"$set": stream_doc},
-            upsert=True
+            projection={"_id": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
         )
-        
-        # Add the database ID for return object
-        if result.upserted_id:
-            stream_doc["_id"] = str(result.upserted_id)
-        else:
-            # Get existing doc ID
-            existing = await self.db.streams.find_one({"tmdb_id": tmdb_id})
-            if existing:
-                stream_doc["_id"] = str(existing["_id"])
+        stream_doc["_id"] = str(result["_id"])
         
         return StreamResponse(**stream_doc)
     
     async def get_cached_streams(self, tmdb_id: int) -> Optional[StreamResponse]:
         """Get cached streaming sources."""
+        start = time.perf_counter()
         stream_doc = await self.db.streams.find_one({
             "tmdb_id": tmdb_id,
             "expires_at": {"$gt": datetime.utcnow()}
         })
+        mongo_cache_stats.observe("streams", time.perf_counter() - start)
+        mongo_cache_stats.incr("streams", "hits" if stream_doc else "misses")
         
         if stream_doc:
             # Convert ObjectId to string
@@ -175,12 +474,11 @@ class DatabaseService:
             {
                 "$text": {"$search": query},
                 "expires_at": {"$gt": datetime.utcnow()}
-            }
+            },
+            card_projection(MovieCard)
         ).skip(skip).limit(limit)
         
-        movies = []
-        async for movie_doc in movies_cursor:
-            movies.append(MovieMetadata(**movie_doc))
+        movies = [MovieCard.from_doc(movie_doc) async for movie_doc in movies_cursor]
         
         # Get total count
         total_count = await self.db.movies.count_documents({
@@ -195,9 +493,15 @@ class DatabaseService:
             "results": movies
         }
     
-    async def get_movies_paginated(self, page: int = 1, limit: int = 20, filters: Dict = None) -> Dict[str, Any]:
+    async def get_movies_paginated(
+        self,
+        page: int = 1,
+        limit: int = 20,
+        filters: Dict = None,
+        cursor: Optional[str] = None,
+        include_total: bool = True
+    ) -> Dict[str, Any]:
         """Get paginated movies with filters."""
-        skip = (page - 1) * limit
         query = {"expires_at": {"$gt": datetime.utcnow()}}
         
         if filters:
@@ -206,25 +510,15 @@ class DatabaseService:
             if filters.get("genre"):
                 query["genres.name"] = filters["genre"]
             if filters.get("year"):
-                if filters["type"] == "tv":
+                if filters.get("type") == "tv":
                     query["first_air_date"] = {"$regex": f"^{filters['year']}"}
                 else:
                     query["release_date"] = {"$regex": f"^{filters['year']}"}
         
-        movies_cursor = self.db.movies.find(query).sort("popularity", -1).skip(skip).limit(limit)
-        
-        movies = []
-        async for movie_doc in movies_cursor:
-            movies.append(MovieMetadata(**movie_doc))
-        
-        total_count = await self.db.movies.count_documents(query)
-        
-        return {
-            "page": page,
-            "total_pages": (total_count // limit) + (1 if total_count % limit else 0),
-            "total_results": total_count,
-            "results": movies
-        }
+        return await self._paginate(
+            self.db.movies, query, "popularity", MovieCard,
+            page, limit, cursor, include_total
+        )
     
     # User Methods
     async def add_to_favorites(self, username: str, favorite_data: Dict) -> bool:
@@ -262,26 +556,19 @@ class DatabaseService:
             logger.error(f"Error removing from favorites: {str(e)}")
             return False
     
-    async def get_user_favorites(self, username: str, page: int = 1, limit: int = 20) -> Dict[str, Any]:
+    async def get_user_favorites(
+        self,
+        username: str,
+        page: int = 1,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        include_total: bool = True
+    ) -> Dict[str, Any]:
         """Get user's favorite movies."""
-        skip = (page - 1) * limit
-        
-        favorites_cursor = self.db.favorites.find(
-            {"username": username}
-        ).sort("added_at", -1).skip(skip).limit(limit)
-        
-        favorites = []
-        async for fav_doc in favorites_cursor:
-            favorites.append(FavoriteItem(**fav_doc))
-        
-        total_count = await self.db.favorites.count_documents({"username": username})
-        
-        return {
-            "page": page,
-            "total_pages": (total_count // limit) + (1 if total_count % limit else 0),
-            "total_results": total_count,
-            "results": favorites
-        }
+        return await self._paginate(
+            self.db.favorites, {"username": username}, "added_at", FavoriteCard,
+            page, limit, cursor, include_total
+        )
     
     async def add_to_watch_history(self, username: str, watch_data: Dict) -> bool:
         """Add movie to user's watch history."""
@@ -307,26 +594,19 @@ class DatabaseService:
             logger.error(f"Error adding to watch history: {str(e)}")
             return False
     
-    async def get_watch_history(self, username: str, page: int = 1, limit: int = 20) -> Dict[str, Any]:
+    async def get_watch_history(
+        self,
+        username: str,
+        page: int = 1,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        include_total: bool = True
+    ) -> Dict[str, Any]:
         """Get user's watch history."""
-        skip = (page - 1) * limit
-        
-        history_cursor = self.db.watch_history.find(
-            {"username": username}
-        ).sort("watched_at", -1).skip(skip).limit(limit)
-        
-        history = []
-        async for hist_doc in history_cursor:
-            history.append(WatchHistoryItem(**hist_doc))
-        
-        total_count = await self.db.watch_history.count_documents({"username": username})
-        
-        return {
-            "page": page,
-            "total_pages": (total_count // limit) + (1 if total_count % limit else 0),
-            "total_results": total_count,
-            "results": history
-        }
+        return await self._paginate(
+            self.db.watch_history, {"username": username}, "watched_at", WatchHistoryCard,
+            page, limit, cursor, include_total
+        )
     
     async def remove_from_watch_history(self, username: str, tmdb_id: int) -> bool:
         """Remove item from watch history."""
@@ -340,10 +620,158 @@ class DatabaseService:
             logger.error(f"Error removing from watch history: {str(e)}")
             return False
     
+    def record_user_activity(self, username: str):
+        """Queue a last_login update, throttled per user."""
+        now = datetime.utcnow()
+        last = self.recorded_activity.get(username)
+        # Always record the first activity of a day so active-user counts stay exact
+        if last and now - last < timedelta(seconds=USER_ACTIVITY_THROTTLE_SECONDS) and last.date() == now.date():
+            return
+        
+        self.recorded_activity[username] = now
+        self.pending_activity[username] = now
+    
+    async def flush_user_activity(self) -> int:
+        """Write queued last_login updates with one bulk_write."""
+        if not self.pending_activity:
+            return 0
+        
+        pending, self.pending_activity = self.pending_activity, {}
+        operations = [
+            UpdateOne({"username": username}, {"$set": {"last_login": last_login}})
+            for username, last_login in pending.items()
+        ]
+        
+        try:
+            await self.db.users.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Error flushing user activity: {str(e)}")
+            # Requeue anything that hasn't been superseded since
+            for username, last_login in pending.items():
+                self.pending_activity.setdefault(username, last_login)
+        
+        return len(operations)
+    
+    async def _activity_writer_loop(self):
+        """Flush queued user activity every USER_ACTIVITY_FLUSH_SECONDS."""
+        while True:
+            await asyncio.sleep(USER_ACTIVITY_FLUSH_SECONDS)
+            await self.flush_user_activity()
+    
+    def start_activity_writer(self):
+        """Start the background last_login writer."""
+        if not self.activity_task:
+            self.activity_task = asyncio.create_task(self._activity_writer_loop())
+    
+    async def stop_activity_writer(self):
+        """Stop the background writer and flush what is left."""
+        if self.activity_task:
+            self.activity_task.cancel()
+            try:
+                await self.activity_task
+            except asyncio.CancelledError:
+                pass
+            self.activity_task = None
+        await self.flush_user_activity()
+    
+    async def flush_cache_metrics(self):
+        """Merge this worker's cache metric deltas into the shared cache_metrics collection."""
+        operations = []
+        # What each operation carries, to put back if it isn't written
+        taken = []
+        for tier, stats in list(cache_stats.items()):
+            counters, latency = stats.take_deltas()
+            for namespace in set(counters) | set(latency):
+                increments = {f"counters.{name}": value for name, value in counters.get(namespace, {}).items() if value}
+                histogram = latency.get(namespace)
+                if histogram:
+                    increments.update({f"latency.b{index}": value for index, value in enumerate(histogram.counts) if value})
+                    increments["latency.count"] = histogram.count
+                    increments["latency.sum"] = histogram.sum
+                if increments:
+                    operations.append(UpdateOne({"tier": tier, "namespace": namespace}, {"$inc": increments}, upsert=True))
+                    taken.append((stats, namespace, counters.get(namespace, {}), histogram))
+        
+        if not operations:
+            return
+        
+        try:
+            await self.db.cache_metrics.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Error flushing cache metrics: {str(e)}")
+            # Unordered writes may partly succeed; only put back what wasn't applied
+            if isinstance(e, BulkWriteError):
+                failed = [taken[error["index"]] for error in e.details.get("writeErrors", [])]
+                if e.details.get("writeConcernErrors"):
+                    failed = taken
+            else:
+                failed = taken
+            for stats, namespace, counters, histogram in failed:
+                stats.restore_deltas(namespace, counters, histogram)
+    
+    async def get_cache_metrics(self) -> Dict[str, Any]:
+        """Get cache metrics aggregated across workers, by tier and namespace."""
+        await self.flush_cache_metrics()
+        
+        tiers: Dict[str, Dict[str, Any]] = {}
+        async for doc in self.db.cache_metrics.find({}):
+            counters = {name: doc.get("counters", {}).get(name, 0) for name in CACHE_COUNTERS}
+            entry = {**counters, "hit_rate": hit_rate(counters)}
+            
+            latency = doc.get("latency")
+            if latency:
+                cumulative = 0
+                buckets = {}
+                for index, bound in enumerate(CACHE_LATENCY_BUCKETS + (float("inf"),)):
+                    cumulative += latency.get(f"b{index}", 0)
+                    buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+                entry["latency_seconds"] = {"count": latency.get("count", 0), "sum": round(latency.get("sum", 0.0), 6), "buckets": buckets}
+            
+            tiers.setdefault(doc["tier"], {})[doc["namespace"]] = entry
+        
+        return tiers
+    
+    async def _cache_metrics_loop(self):
+        """Flush cache metrics every CACHE_METRICS_FLUSH_SECONDS."""
+        while True:
+            await asyncio.sleep(CACHE_METRICS_FLUSH_SECONDS)
+            await self.flush_cache_metrics()
+    
+    def start_cache_metrics_writer(self):
+        """Start the background cache metrics writer."""
+        if not self.cache_metrics_task:
+            self.cache_metrics_task = asyncio.create_task(self._cache_metrics_loop())
+    
+    async def stop_cache_metrics_writer(self):
+        """Stop the background writer and flush what is left."""
+        if self.cache_metrics_task:
+            self.cache_metrics_task.cancel()
+            try:
+                await self.cache_metrics_task
+            except asyncio.CancelledError:
+                pass
+            self.cache_metrics_task = None
+        await self.flush_cache_metrics()
+    
     # Admin Methods
     async def get_system_stats(self) -> Dict[str, Any]:
         """Get system statistics."""
         try:
+            # Make queued last_login updates visible to the active users count
+            await self.flush_user_activity()
+            
+            cache_metrics = await self.get_cache_metrics()
+            
+            # Requests answered from any cache tier: response cache lookups start at L1
+            # and L2 only sees L1 misses, so L2 hits add to L1 lookups
+            hits = lookups = 0
+            for tier, namespaces in cache_metrics.items():
+                for counters in namespaces.values():
+                    hits += counters["hits"]
+                    if tier != "l2":
+                        lookups += counters["hits"] + counters["misses"]
+            
+
             total_users = await self.db.users.count_documents({})
             total_movies = await self.db.movies.count_documents({})
             total_streams = await self.db.streams.count_documents({})
@@ -359,19 +787,50 @@ class DatabaseService:
                 "total_movies_cached": total_movies,
                 "total_streams_cached": total_streams,
                 "active_users_today": active_users,
-                "cache_hit_rate": 0.85  # Mock value - can be calculated from actual metrics
+                "cache_hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "cache_stats": cache_metrics
             }
         except Exception as e:
             logger.error(f"Error getting system stats: {str(e)}")
             return {}
     
+    # Leases: one worker at a time runs a background job
+    async def claim_lease(self, name: str, holder: str, seconds: float) -> bool:
+        """Take a named lease for seconds; False if another holder's lease hasn't expired."""
+        now = datetime.utcnow()
+        try:
+            await self.db.leases.find_one_and_update(
+                {"_id": name, "expires_at": {"$lte": now}},
+                {"$set": {"holder": holder, "expires_at": now + timedelta(seconds=seconds)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The lease exists and hasn't expired
+            return False
+        return True
+    
+    async def extend_lease(self, name: str, holder: str, seconds: float) -> bool:
+        """Push a held lease's expiry out; False if another holder has taken it over."""
+        result = await self.db.leases.update_one(
+            {"_id": name, "holder": holder},
+            {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=seconds)}}
+        )
+        return result.matched_count == 1
+    
     async def clear_expired_cache(self):
         """Clear expired cache entries."""
         try:
             now = datetime.utcnow()
             
-            # Clear expired movies
-            movie_result = await self.db.movies.delete_many({"expires_at": {"$lt": now}})
+            # Clear movies past the stale-while-revalidate window, which are still served until then;
+            # hooks get the ids and check them against their own expiry, since a doc may be
+            # rewritten between the read and the delete
+            cutoff = movie_stale_cutoff(now)
+            expired = {"expires_at": {"$lt": cutoff}}
+            tmdb_ids = await self.db.movies.distinct("tmdb_id", expired)
+            movie_result = await self.db.movies.delete_many(expired)
+            if tmdb_ids:
+                self._notify_movie_deletes(tmdb_ids, cutoff)
             
             # Clear expired streams
             stream_result = await self.db.streams.delete_many({"expires_at": {"$lt": now}})
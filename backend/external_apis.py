@@ -1,11 +1,16 @@
 import aiohttp
+import asyncio
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Awaitable
 from cachetools import TTLCache
+from cache import response_cache
+from database import db_service
+from metrics import upstream_request_duration, METRICS_ENABLED
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from pathlib import Path
 import logging
+import time
 
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
@@ -15,51 +20,333 @@ logger = logging.getLogger(__name__)
 
 # API Keys and URLs
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
-TMDB_BASE_URL = "https://api.themoviedb.org/3"
+TMDB_BASE_URL = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3")
 CONSUMET_API_BASE = os.getenv("CONSUMET_API_BASE", "https://api.consumet.org")
 
 # Debug logging
 logger.info(f"TMDB API Key loaded: {'Yes' if TMDB_API_KEY else 'No'}")
 logger.info(f"Consumet API Base: {CONSUMET_API_BASE}")
 
-# Simple in-memory cache
-cache = TTLCache(maxsize=1000, ttl=3600)  # 1 hour TTL
+# Negative cache for TMDB 404s so unknown ids don't hit upstream every time
+not_found_cache = TTLCache(maxsize=10000, ttl=int(os.getenv("TMDB_NOT_FOUND_TTL", "600")))
+
+# Short negative cache for failed upstream requests (errors, timeouts, 5xx)
+failure_cache = TTLCache(maxsize=10000, ttl=int(os.getenv("UPSTREAM_FAILURE_TTL", "15")))
+
+# HTTP connection pool settings
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_TOTAL_TIMEOUT = float(os.getenv("HTTP_TOTAL_TIMEOUT", "15"))
+CONSUMET_TIMEOUT = float(os.getenv("CONSUMET_TIMEOUT", "30"))
+
+# Circuit breaker settings
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+BREAKER_MIN_TIMEOUT = float(os.getenv("BREAKER_MIN_TIMEOUT", "2"))
+
+# Alternative source fan-out settings
+ALT_SOURCE_PROVIDERS = ["flixhq", "dramacool", "gogoanime"]  # Add more as needed
+ALT_SOURCE_PROVIDER_TIMEOUT = float(os.getenv("ALT_SOURCE_PROVIDER_TIMEOUT", "8"))
+ALT_SOURCE_BUDGET = float(os.getenv("ALT_SOURCE_BUDGET", "10"))
+ALT_SOURCE_MIN_RESULTS = int(os.getenv("ALT_SOURCE_MIN_RESULTS", "3"))
+ALT_SOURCE_MAX_FAILURES = int(os.getenv("ALT_SOURCE_MAX_FAILURES", "3"))
+ALT_SOURCE_COOLDOWN = float(os.getenv("ALT_SOURCE_COOLDOWN", "60"))
+# A provider is slow when its latency EWMA nears its deadline, or is several
+# times its fastest peer's (ignoring anything under the floor)
+ALT_SOURCE_SLOW_LATENCY = float(os.getenv("ALT_SOURCE_SLOW_LATENCY", str(ALT_SOURCE_PROVIDER_TIMEOUT * 0.75)))
+ALT_SOURCE_SLOW_FACTOR = float(os.getenv("ALT_SOURCE_SLOW_FACTOR", "3"))
+ALT_SOURCE_SLOW_FLOOR = float(os.getenv("ALT_SOURCE_SLOW_FLOOR", "1"))
+
+def upstream_trace_config() -> aiohttp.TraceConfig:
+    """Trace hooks timing every upstream request made through the shared session."""
+    async def on_request_start(session, context, params):
+        context.start = time.perf_counter()
+    
+    async def on_request_end(session, context, params):
+        upstream_request_duration.observe((params.url.host, str(params.response.status)), time.perf_counter() - context.start)
+    
+    async def on_request_exception(session, context, params):
+        upstream_request_duration.observe((params.url.host, "error"), time.perf_counter() - context.start)
+    
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
+
+class HTTPClient:
+    """Long-lived aiohttp session shared by the upstream services."""
+
+    def __init__(self):
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.connector: Optional[aiohttp.TCPConnector] = None
+        self.requests = 0
+    
+    async def start(self):
+        """Open the keep-alive connection pool."""
+        if self.session and not self.session.closed:
+            return
+        
+        self.connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            use_dns_cache=True,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT
+        )
+        self.session = aiohttp.ClientSession(
+            connector=self.connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_TOTAL_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            trace_configs=[upstream_trace_config()] if METRICS_ENABLED else None
+        )
+        logger.info(f"HTTP client pool started (limit={HTTP_POOL_LIMIT}, per_host={HTTP_POOL_LIMIT_PER_HOST})")
+    
+    async def close(self):
+        """Close the session and every pooled connection."""
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        self.connector = None
+    
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Get the shared session, opening it lazily outside the app lifecycle."""
+        if not self.session or self.session.closed:
+            await self.start()
+        self.requests += 1
+        return self.session
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get connection pool statistics."""
+        if not self.connector or self.connector.closed:
+            return {"open": 0, "idle": 0, "acquired": 0, "requests": self.requests}
+        
+        idle = sum(len(conns) for conns in getattr(self.connector, "_conns", {}).values())
+        acquired = len(getattr(self.connector, "_acquired", ()))
+        
+        return {
+            "open": idle + acquired,
+            "idle": idle,
+            "acquired": acquired,
+            "limit": self.connector.limit,
+            "limit_per_host": self.connector.limit_per_host,
+            "requests": self.requests
+        }
+
+http_client = HTTPClient()
+
+class CircuitBreaker:
+    """Closed/open/half-open circuit breaker with an EWMA-based adaptive timeout."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, name: str, max_timeout: float):
+        self.name = name
+        self.max_timeout = max_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.probe_started = 0.0
+        self.latency_ewma: Optional[float] = None
+        self.latency_deviation = 0.0
+        self.rejected = 0
+    
+    def allow_request(self) -> bool:
+        """Whether a request may go upstream; half-open lets one probe through."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < BREAKER_RESET_TIMEOUT:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+        
+        if self.state == self.HALF_OPEN:
+            # A probe that never reported back (e.g. cancelled) doesn't block forever
+            if self.probe_in_flight and time.monotonic() - self.probe_started < self.max_timeout:
+                self.rejected += 1
+                return False
+            self.probe_in_flight = True
+            self.probe_started = time.monotonic()
+        
+        return True
+    
+    def timeout(self) -> float:
+        """Request timeout from smoothed latency plus four deviations, like TCP's RTO."""
+        if self.latency_ewma is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(BREAKER_MIN_TIMEOUT, self.latency_ewma + 4 * self.latency_deviation))
+    
+    def record_success(self, latency: float):
+        """Record a healthy response and close the breaker."""
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+            self.latency_deviation = latency / 2
+        else:
+            self.latency_deviation = 0.75 * self.latency_deviation + 0.25 * abs(latency - self.latency_ewma)
+            self.latency_ewma = 0.875 * self.latency_ewma + 0.125 * latency
+        
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit breaker for {self.name} closed")
+        self.state = self.CLOSED
+    
+    def record_failure(self):
+        """Record a failed request, opening the breaker past the threshold."""
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= BREAKER_FAILURE_THRESHOLD:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit breaker for {self.name} opened")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get breaker state."""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "rejected": self.rejected,
+            "latency_ewma": round(self.latency_ewma, 4) if self.latency_ewma is not None else None,
+            "timeout": round(self.timeout(), 3)
+        }
+
+tmdb_breaker = CircuitBreaker("tmdb", HTTP_TOTAL_TIMEOUT)
+consumet_breaker = CircuitBreaker("consumet", CONSUMET_TIMEOUT)
+
+class SingleFlight:
+    """Coalesce concurrent fetches for the same cache key into one upstream call."""
+
+    def __init__(self):
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        self.originated = 0
+        self.coalesced = 0
+    
+    async def do(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fetch once per key; concurrent callers await the same result."""
+        task = self.in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+        
+        self.originated += 1
+        task = asyncio.ensure_future(fetch())
+        self.in_flight[key] = task
+        task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # Shield so a cancelled originator doesn't cancel the fetch for the other waiters
+        return await asyncio.shield(task)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get coalescing statistics."""
+        return {
+            "in_flight": len(self.in_flight),
+            "originated": self.originated,
+            "coalesced": self.coalesced
+        }
+
+upstream_flights = SingleFlight()
 
 class TMDBService:
     def __init__(self):
         self.api_key = TMDB_API_KEY
         self.base_url = TMDB_BASE_URL
     
-    async def _make_request(self, endpoint: str, params: Dict = None) -> Dict[str, Any]:
-        """Make request to TMDB API."""
-        if not params:
-            params = {}
-        
-        params.update({
-            "api_key": self.api_key,
-            "language": "en-US"
-        })
+    def _request_params(self, params: Dict = None) -> Dict[str, Any]:
+        """Add the API key and language to request parameters."""
+        return {**(params or {}), "api_key": self.api_key, "language": "en-US"}
+    
+    def _cache_key(self, endpoint: str, params: Dict[str, Any]) -> str:
+        # The API key stays out of cache keys, which are shared through L2
+        return f"tmdb_{endpoint}_{str(sorted((k, v) for k, v in params.items() if k != 'api_key'))}"
+    
+    def is_not_found(self, endpoint: str, params: Dict = None) -> bool:
+        """Check whether TMDB answered 404 for a request recently, as opposed to failing."""
+        return self._cache_key(endpoint, self._request_params(params)) in not_found_cache
+    
+    async def _make_request(self, endpoint: str, params: Dict = None, refresh: bool = False) -> Dict[str, Any]:
+        """Make request to TMDB API.
         
+        refresh=True skips the L1/L2 response cache and re-fetches from TMDB,
+        for refreshes of data that is about to expire along with its cache entry.
+        """
+        params = self._request_params(params)
         url = f"{self.base_url}/{endpoint}"
-        cache_key = f"tmdb_{endpoint}_{str(sorted(params.items()))}"
+        cache_key = self._cache_key(endpoint, params)
+        namespace = self._cache_namespace(endpoint)
         
         # Check cache first
-        if cache_key in cache:
-            logger.info(f"Cache hit for {cache_key}")
-            return cache[cache_key]
+        if not refresh:
+            cached = response_cache.get_local(namespace, cache_key)
+            if cached is not None:
+                logger.info(f"Cache hit for {cache_key}")
+                return cached
+        
+        if cache_key in not_found_cache or cache_key in failure_cache:
+            return {}
+        
+        if refresh:
+            return await upstream_flights.do(f"{cache_key}:refresh", lambda: self._refresh(namespace, url, params, cache_key))
+        return await upstream_flights.do(cache_key, lambda: self._load(namespace, url, params, cache_key))
+    
+    def _cache_namespace(self, endpoint: str) -> str:
+        """Get the cache namespace for an endpoint."""
+        parts = endpoint.split("/")
+        if parts[0] == "genre":
+            return "tmdb_genres"
+        if parts[0] in ("movie", "tv") and len(parts) == 2 and parts[1].isdigit():
+            return "tmdb_details"
+        return "tmdb_lists"
+    
+    async def _load(self, namespace: str, url: str, params: Dict, cache_key: str) -> Dict[str, Any]:
+        """Load from the shared cache, then from TMDB."""
+        cached = await response_cache.get_shared(namespace, cache_key)
+        if cached is not None:
+            return cached
         
+        # Fail fast while TMDB is down
+        if not tmdb_breaker.allow_request():
+            return {}
+        
+        return await self._fetch(namespace, url, params, cache_key)
+    
+    async def _refresh(self, namespace: str, url: str, params: Dict, cache_key: str) -> Dict[str, Any]:
+        """Fetch from TMDB regardless of the shared cache, replacing its entry."""
+        if not tmdb_breaker.allow_request():
+            return {}
+        
+        return await self._fetch(namespace, url, params, cache_key)
+    
+    async def _fetch(self, namespace: str, url: str, params: Dict, cache_key: str) -> Dict[str, Any]:
+        """Fetch from TMDB and populate the cache."""
+        start = time.monotonic()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        cache[cache_key] = data
-                        return data
+            session = await http_client.get_session()
+            async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=tmdb_breaker.timeout(), connect=HTTP_CONNECT_TIMEOUT)) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    tmdb_breaker.record_success(time.monotonic() - start)
+                    await response_cache.set(namespace, cache_key, data)
+                    return data
+                elif response.status == 404:
+                    tmdb_breaker.record_success(time.monotonic() - start)
+                    not_found_cache[cache_key] = True
+                    return {}
+                else:
+                    logger.error(f"TMDB API error: {response.status}")
+                    if response.status >= 500 or response.status == 429:
+                        tmdb_breaker.record_failure()
+                        failure_cache[cache_key] = True
                     else:
-                        logger.error(f"TMDB API error: {response.status}")
-                        return {}
+                        tmdb_breaker.record_success(time.monotonic() - start)
+                    return {}
         except Exception as e:
             logger.error(f"TMDB API request failed: {str(e)}")
+            tmdb_breaker.record_failure()
+            failure_cache[cache_key] = True
             return {}
     
     async def get_popular_movies(self, page: int = 1) -> Dict[str, Any]:
@@ -79,53 +366,141 @@ class TMDBService:
         return await self._make_request("search/multi", {
             "query": query,
             "page": page,
-            "include_adult": False
+            "include_adult": "false"
         })
     
-    async def get_movie_details(self, movie_id: int) -> Dict[str, Any]:
+    async def get_movie_details(self, movie_id: int, refresh: bool = False) -> Dict[str, Any]:
         """Get movie details."""
-        return await self._make_request(f"movie/{movie_id}")
+        return await self._make_request(f"movie/{movie_id}", refresh=refresh)
     
-    async def get_tv_details(self, tv_id: int) -> Dict[str, Any]:
+    async def get_tv_details(self, tv_id: int, refresh: bool = False) -> Dict[str, Any]:
         """Get TV show details."""
-        return await self._make_request(f"tv/{tv_id}")
+        return await self._make_request(f"tv/{tv_id}", refresh=refresh)
     
     async def get_genres(self, media_type: str = "movie") -> Dict[str, Any]:
         """Get genres list."""
         return await self._make_request(f"genre/{media_type}/list")
 
+class ProviderHealth:
+    """Latency and failure tracking for one streaming provider."""
+
+    def __init__(self):
+        self.latency_ewma: Optional[float] = None
+        self.consecutive_failures = 0
+        self.skip_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.slow_skips = 0
+    
+    def is_available(self) -> bool:
+        """Whether the provider should be queried (retried once its cooldown passes)."""
+        return time.monotonic() >= self.skip_until
+    
+    def record(self, success: bool, latency: float):
+        """Record the outcome of one request."""
+        self.requests += 1
+        self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+        
+        if success:
+            self.consecutive_failures = 0
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+        
+        # Skip providers that keep failing or timing out, or that answer close to their deadline
+        if self.consecutive_failures >= ALT_SOURCE_MAX_FAILURES:
+            self.skip_until = time.monotonic() + ALT_SOURCE_COOLDOWN
+        elif self.latency_ewma > ALT_SOURCE_SLOW_LATENCY:
+            self.skip_slow()
+    
+    def skip_slow(self):
+        """Skip a slow provider for a cooldown, then measure its latency afresh."""
+        self.slow_skips += 1
+        self.skip_until = time.monotonic() + ALT_SOURCE_COOLDOWN
+        self.latency_ewma = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get health statistics."""
+        return {
+            "available": self.is_available(),
+            "latency_ewma": round(self.latency_ewma, 4) if self.latency_ewma is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "requests": self.requests,
+            "failures": self.failures,
+            "slow_skips": self.slow_skips
+        }
+
 class ConsumetService:
     def __init__(self):
         self.base_url = CONSUMET_API_BASE
+        self.provider_health = {provider: ProviderHealth() for provider in ALT_SOURCE_PROVIDERS}
     
-    async def _make_request(self, endpoint: str, params: Dict = None) -> Dict[str, Any]:
-        """Make request to Consumet API."""
+    async def _make_request(self, endpoint: str, params: Dict = None, timeout: float = CONSUMET_TIMEOUT, coalesce: bool = True) -> Dict[str, Any]:
+        """Make request to Consumet API.
+        
+        Coalesced requests run shielded, so cancelling the caller leaves the
+        upstream call running; pass coalesce=False where cancelling must abort it.
+        """
         url = f"{self.base_url}/{endpoint}"
         cache_key = f"consumet_{endpoint}_{str(sorted((params or {}).items()))}"
         
         # Check cache first (shorter TTL for streams)
-        if cache_key in cache:
+        cached = response_cache.get_local("streams", cache_key)
+        if cached is not None:
             logger.info(f"Cache hit for {cache_key}")
-            return cache[cache_key]
+            return cached
+        
+        if cache_key in failure_cache:
+            return {}
+        
+        if not coalesce:
+            return await self._load(endpoint, url, params, cache_key, timeout)
+        return await upstream_flights.do(cache_key, lambda: self._load(endpoint, url, params, cache_key, timeout))
+    
+    async def _load(self, endpoint: str, url: str, params: Optional[Dict], cache_key: str, timeout: float) -> Dict[str, Any]:
+        """Load from the shared cache, then from Consumet."""
+        cached = await response_cache.get_shared("streams", cache_key)
+        if cached is not None:
+            return cached
+        
+        # Fail fast while Consumet is down
+        if not consumet_breaker.allow_request():
+            return {}
         
+        return await self._fetch(endpoint, url, params, cache_key, timeout)
+    
+    async def _fetch(self, endpoint: str, url: str, params: Optional[Dict], cache_key: str, timeout: float) -> Dict[str, Any]:
+        """Fetch from Consumet and populate the cache."""
+        start = time.monotonic()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params, timeout=30) as response:
-                    if response.status == 200:
-                        # Try to parse as JSON
-                        try:
-                            data = await response.json()
-                            cache[cache_key] = data
-                            return data
-                        except:
-                            # If not JSON, return empty dict
-                            logger.warning(f"Consumet API returned non-JSON response for {endpoint}")
-                            return {}
-                    else:
-                        logger.error(f"Consumet API error: {response.status}")
+            session = await http_client.get_session()
+            timeout = min(timeout, consumet_breaker.timeout())
+            async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=timeout, connect=HTTP_CONNECT_TIMEOUT)) as response:
+                if response.status == 200:
+                    # Try to parse as JSON
+                    try:
+                        data = await response.json()
+                        consumet_breaker.record_success(time.monotonic() - start)
+                        await response_cache.set("streams", cache_key, data)
+                        return data
+                    except Exception:
+                        # If not JSON, return empty dict
+                        logger.warning(f"Consumet API returned non-JSON response for {endpoint}")
+                        consumet_breaker.record_failure()
+                        failure_cache[cache_key] = True
                         return {}
+                else:
+                    logger.error(f"Consumet API error: {response.status}")
+                    if response.status >= 500 or response.status == 429:
+                        consumet_breaker.record_failure()
+                        failure_cache[cache_key] = True
+                    else:
+                        consumet_breaker.record_success(time.monotonic() - start)
+                    return {}
         except Exception as e:
             logger.error(f"Consumet API request failed: {str(e)}")
+            consumet_breaker.record_failure()
+            failure_cache[cache_key] = True
             return {}
     
     async def search_movies(self, query: str) -> Dict[str, Any]:
@@ -143,39 +518,170 @@ class ConsumetService:
             "mediaId": media_id
         })
 
-    async def search_alternative_sources(self, title: str, year: str = None) -> List[Dict[str, Any]]:
-        """Search for alternative streaming sources."""
+    async def _search_provider(self, provider: str, title: str, year: str = None, deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Search one provider within its deadline, recording its health.
+        
+        deadline is the caller's overall monotonic deadline, used to tell a
+        timed-out search apart from one cancelled because others answered first.
+        """
+        params = {"query": title}
+        if year:
+            params["year"] = year
+        
+        health = self.provider_health.setdefault(provider, ProviderHealth())
+        start = time.monotonic()
+        try:
+            # Not coalesced, so a cancelled search closes its upstream request
+            result = await self._make_request(f"movies/{provider}", params, ALT_SOURCE_PROVIDER_TIMEOUT, coalesce=False)
+        except asyncio.CancelledError:
+            # Only a cut-off past the budget or the provider's own deadline is a
+            # timeout; losing the race to quorum or min_results is neutral
+            now = time.monotonic()
+            if (deadline is not None and now >= deadline) or now - start >= ALT_SOURCE_PROVIDER_TIMEOUT:
+                health.record(False, now - start)
+            raise
+        except Exception as e:
+            logger.error(f"Error searching {provider}: {str(e)}")
+            result = {}
+        
+        # Errors and timeouts come back as an empty dict
+        health.record("results" in result, time.monotonic() - start)
+        return result.get("results", [])[:3]  # Limit to prevent overload
+    
+    async def search_alternative_sources(
+        self,
+        title: str,
+        year: str = None,
+        min_results: int = ALT_SOURCE_MIN_RESULTS,
+        quorum: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Search for alternative streaming sources across providers concurrently.
+        
+        Returns once min_results sources or quorum provider replies are in, or
+        when ALT_SOURCE_BUDGET runs out; unfinished provider calls are cancelled,
+        which aborts their upstream requests. Only calls cut off by the budget
+        count as provider timeouts. Providers answering near their deadline, or
+        ALT_SOURCE_SLOW_FACTOR times slower than the fastest one, sit out for
+        ALT_SOURCE_COOLDOWN.
+        """
         sources = []
+        available = {provider: health for provider, health in self.provider_health.items() if health.is_available()}
         
-        # Try multiple providers
-        providers = ["flixhq", "dramacool", "gogoanime"]  # Add more as needed
+        # Leave out providers that are much slower than their fastest peer
+        latencies = [health.latency_ewma for health in available.values() if health.latency_ewma is not None]
+        slow_after = max(ALT_SOURCE_SLOW_FACTOR * min(latencies), ALT_SOURCE_SLOW_FLOOR) if latencies else None
+        providers = []
+        for provider, health in available.items():
+            if slow_after is not None and health.latency_ewma is not None and health.latency_ewma > slow_after:
+                health.skip_slow()
+            else:
+                providers.append(provider)
+        if not providers:
+            return sources
         
-        for provider in providers:
-            try:
-                endpoint = f"movies/{provider}"
-                params = {"query": title}
-                if year:
-                    params["year"] = year
+        deadline = time.monotonic() + ALT_SOURCE_BUDGET
+        pending = {asyncio.create_task(self._search_provider(provider, title, year, deadline)) for provider in providers}
+        replies = 0
+        
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    replies += 1
+                    sources.extend(task.result())
                 
-                result = await self._make_request(endpoint, params)
-                if result.get("results"):
-                    sources.extend(result["results"][:3])  # Limit to prevent overload
-            except Exception as e:
-                logger.error(f"Error searching {provider}: {str(e)}")
-                continue
+                if len(sources) >= min_results or (quorum and replies >= quorum):
+                    break
+        finally:
+            # Cancel stragglers
+            for task in pending:
+                task.cancel()
         
         return sources
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-provider health."""
+        return {provider: health.get_stats() for provider, health in self.provider_health.items()}
+
+# Helper function to normalize movie data
+def normalize_movie_data(movie_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize movie data from TMDB."""
+    # Handle both movie and TV data structures
+    title = movie_data.get("title") or movie_data.get("name", "")
+    media_type = "tv" if "first_air_date" in movie_data else "movie"
+    
+    return {
+        "id": movie_data.get("id"),
+        "tmdb_id": movie_data.get("id"),  # Make sure tmdb_id is set
+        "title": title,
+        "overview": movie_data.get("overview", ""),
+        "poster_path": f"https://image.tmdb.org/t/p/w500{movie_data['poster_path']}" if movie_data.get("poster_path") else None,
+        "backdrop_path": f"https://image.tmdb.org/t/p/w1280{movie_data['backdrop_path']}" if movie_data.get("backdrop_path") else None,
+        "release_date": movie_data.get("release_date") or movie_data.get("first_air_date"),
+        "first_air_date": movie_data.get("first_air_date"),
+        "genres": [{"id": g["id"], "name": g["name"]} for g in movie_data.get("genres", [])],
+        "vote_average": movie_data.get("vote_average", 0.0),
+        "vote_count": movie_data.get("vote_count", 0),
+        "runtime": movie_data.get("runtime"),
+        "number_of_seasons": movie_data.get("number_of_seasons"),
+        "number_of_episodes": movie_data.get("number_of_episodes"),
+        "type": media_type,
+        "adult": movie_data.get("adult", False),
+        "original_language": movie_data.get("original_language", "en"),
+        "popularity": movie_data.get("popularity", 0.0),
+        "year": (movie_data.get("release_date") or movie_data.get("first_air_date", ""))[:4] if (movie_data.get("release_date") or movie_data.get("first_air_date")) else None
+    }
 
 # Service instances
 tmdb_service = TMDBService()
 consumet_service = ConsumetService()
 
-async def get_movie_metadata(tmdb_id: int, media_type: str = "movie") -> Dict[str, Any]:
-    """Get movie/TV metadata from TMDB."""
+async def get_movie_metadata(tmdb_id: int, media_type: str = "movie", refresh: bool = False) -> Dict[str, Any]:
+    """Get movie/TV metadata from TMDB; refresh=True bypasses the response cache."""
     if media_type == "movie":
-        return await tmdb_service.get_movie_details(tmdb_id)
+        return await tmdb_service.get_movie_details(tmdb_id, refresh)
     else:
-        return await tmdb_service.get_tv_details(tmdb_id)
+        return await tmdb_service.get_tv_details(tmdb_id, refresh)
+
+async def resolve_movie_metadata(
+    movie_id: int,
+    refresh: bool = False,
+    before_fetch: Optional[Callable[[], Awaitable[None]]] = None
+) -> Dict[str, Any]:
+    """Get TMDB metadata, using the remembered media type to skip the movie-then-tv probe.
+    
+    Shared by request handlers, background refreshes and the cache warmer, so
+    nothing picks the TMDB endpoint from a stored doc type. before_fetch is
+    awaited ahead of each TMDB lookup, which lets callers budget every call.
+    """
+    async def fetch(media_type: str) -> Dict[str, Any]:
+        if before_fetch:
+            await before_fetch()
+        return await get_movie_metadata(movie_id, media_type, refresh)
+    
+    media_type = await db_service.get_media_type(movie_id)
+    if media_type:
+        return await fetch(media_type)
+    
+    # Unknown id: try as a movie, then as a TV show
+    movie_data = await fetch("movie")
+    if movie_data:
+        await db_service.set_media_type(movie_id, "movie")
+        return movie_data
+    
+    # Movie and TV ids overlap, so only a real 404 means this may be a show;
+    # after a timeout or 5xx the tv lookup could return an unrelated title
+    if not tmdb_service.is_not_found(f"movie/{movie_id}"):
+        return {}
+    
+    movie_data = await fetch("tv")
+    if movie_data:
+        await db_service.set_media_type(movie_id, "tv")
+    return movie_data
 
 async def search_content(query: str, page: int = 1) -> Dict[str, Any]:
     """Search content across TMDB."""
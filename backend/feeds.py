@@ -0,0 +1,230 @@
+from fastapi.encoders import jsonable_encoder
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any
+from dotenv import load_dotenv
+from pathlib import Path
+import asyncio
+import os
+import uuid
+import logging
+
+from external_apis import tmdb_service, normalize_movie_data, get_genres_list
+from database import db_service
+from models import MovieCard, card_json
+from warmer import background_tmdb_budget
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env', override=True)
+
+logger = logging.getLogger(__name__)
+
+# Feed settings
+FEED_REFRESH_SECONDS = int(os.getenv("FEED_REFRESH_SECONDS", "600"))
+FEED_PAGES = int(os.getenv("FEED_PAGES", "5"))
+FEED_YEARS = int(os.getenv("FEED_YEARS", "5"))
+FEED_PAGE_SIZE = 20
+# One worker builds at a time; the others wait for its feeds
+FEED_LEASE_ID = "feed_builder"
+FEED_BUILD_LEASE_SECONDS = int(os.getenv("FEED_BUILD_LEASE_SECONDS", "300"))
+FEED_LEASE_POLL_SECONDS = 10
+
+def movies_feed_key(media_type: Optional[str] = None, genre: Optional[str] = None, year: Optional[str] = None) -> str:
+    """Get the feed key for a /api/movies filter combination."""
+    return f"movies:{media_type or 'all'}:{genre or '*'}:{year or '*'}"
+
+TRENDING_FEED_KEY = "trending:all:week"
+
+class FeedBuilder:
+    """Periodically materializes home-feed pages so list endpoints are O(1) lookups."""
+    
+    def __init__(self):
+        # feed key -> list of ready-to-serve pages (page 1 first)
+        self.feeds: Dict[str, List[Dict[str, Any]]] = {}
+        self.built_at: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+        self.worker_id = uuid.uuid4().hex
+        self.builds = 0
+    
+    def get_page(self, key: str, page: int = 1) -> Optional[Dict[str, Any]]:
+        """Get a materialized page, or None if it isn't built."""
+        pages = self.feeds.get(key)
+        if pages and 1 <= page <= len(pages):
+            return pages[page - 1]
+        return None
+    
+    async def _build_movies_feed(self, filters: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Materialize the first FEED_PAGES pages of /api/movies for a filter set."""
+        pages = []
+        total = None
+        for page in range(1, FEED_PAGES + 1):
+            data = await db_service.get_movies_paginated(page, FEED_PAGE_SIZE, filters, include_total=total is None)
+            if total is None:
+                total = (data["total_pages"], data["total_results"])
+            data["total_pages"], data["total_results"] = total
+            
+            if not data["results"]:
+                break
+            pages.append(jsonable_encoder(data, custom_encoder={MovieCard: card_json}))
+            if not data["next_cursor"]:
+                break
+        return pages
+    
+    async def _budgeted(self, calls: int = 1):
+        """Take TMDB tokens from the background budget shared with the cache warmer."""
+        # A zero budget only switches the warmer off; feeds are still built
+        if background_tmdb_budget.rate:
+            for _ in range(calls):
+                await background_tmdb_budget.acquire()
+    
+    async def _build_trending_feed(self) -> List[Dict[str, Any]]:
+        """Materialize /api/trending from TMDB."""
+        await self._budgeted()
+        trending_data = await tmdb_service.get_trending("all", "week")
+        results = [
+            normalize_movie_data(movie) for movie in trending_data.get("results", [])
+            if movie.get("media_type") in ["movie", "tv"]
+        ]
+        if not results:
+            return []
+        
+        await db_service.cache_movies_bulk(results)
+        return [{
+            "page": 1,
+            "total_pages": 1,
+            "total_results": len(results),
+            "results": results
+        }]
+    
+    async def build(self):
+        """Rebuild every feed and store it in memory and in the feeds collection."""
+        started = datetime.utcnow()
+        
+        # Make sure the popular lists are cached before materializing from Mongo
+        for page in range(1, FEED_PAGES + 1):
+            await self._budgeted(2)
+            for tmdb_data in await asyncio.gather(
+                tmdb_service.get_popular_movies(page),
+                tmdb_service.get_popular_tv(page)
+            ):
+                await db_service.cache_movies_bulk([
+                    normalize_movie_data(movie) for movie in tmdb_data.get("results", [])
+                ])
+        
+        await self._budgeted(2)
+        genres = [genre["name"] for genre in await get_genres_list()]
+        years = [str(started.year - offset) for offset in range(FEED_YEARS)]
+        
+        feeds = {}
+        trending = await self._build_trending_feed()
+        if trending:
+            feeds[TRENDING_FEED_KEY] = trending
+        
+        for media_type in (None, "movie", "tv"):
+            filter_sets = [{}]
+            filter_sets += [{"genre": genre} for genre in genres]
+            filter_sets += [{"year": year} for year in years]
+            
+            for filters in filter_sets:
+                if media_type:
+                    filters = {**filters, "type": media_type}
+                pages = await self._build_movies_feed(filters)
+                if pages:
+                    feeds[movies_feed_key(media_type, filters.get("genre"), filters.get("year"))] = pages
+        
+        self.feeds = feeds
+        self.built_at = started
+        self.builds += 1
+        await self._save()
+        logger.info(f"Built {len(feeds)} feeds in {(datetime.utcnow() - started).total_seconds():.1f}s")
+    
+    async def _save(self):
+        """Persist feeds so other workers and restarts can load them."""
+        try:
+            for key, pages in self.feeds.items():
+                await db_service.db.feeds.update_one(
+                    {"key": key},
+                    {"$set": {"key": key, "pages": pages, "built_at": self.built_at}},
+                    upsert=True
+                )
+            # Drop feeds that no longer have results
+            await db_service.db.feeds.delete_many({"built_at": {"$lt": self.built_at}})
+        except Exception as e:
+            logger.error(f"Error saving feeds: {str(e)}")
+    
+    async def load(self) -> bool:
+        """Load feeds built recently by any worker; returns False if they are stale."""
+        try:
+            fresh_after = datetime.utcnow() - timedelta(seconds=FEED_REFRESH_SECONDS)
+            feeds = {}
+            built_at = None
+            async for doc in db_service.db.feeds.find({"built_at": {"$gt": fresh_after}}):
+                feeds[doc["key"]] = doc["pages"]
+                built_at = max(built_at or doc["built_at"], doc["built_at"])
+            
+            if not feeds:
+                return False
+            
+            self.feeds = feeds
+            self.built_at = built_at
+            return True
+        except Exception as e:
+            logger.error(f"Error loading feeds: {str(e)}")
+            return False
+    
+    async def refresh(self) -> bool:
+        """Load fresh feeds, or build them under the build lease; False if another worker holds it."""
+        if await self.load():
+            return True
+        if not await db_service.claim_lease(FEED_LEASE_ID, self.worker_id, FEED_BUILD_LEASE_SECONDS):
+            return False
+        await self.build()
+        return True
+    
+    async def _refresh_loop(self):
+        """Keep feeds fresh, reusing another worker's build when there is one."""
+        failures = 0
+        while True:
+            try:
+                if not await self.refresh():
+                    # Another worker is building; pick its feeds up shortly
+                    await asyncio.sleep(FEED_LEASE_POLL_SECONDS)
+                    continue
+                failures = 0
+            except Exception as e:
+                failures += 1
+                logger.error(f"Feed build failed: {str(e)}")
+            
+            if failures:
+                # Back off after failed builds rather than hammering a struggling upstream
+                await asyncio.sleep(min(FEED_REFRESH_SECONDS, 2 ** failures * 5))
+                continue
+            
+            # Wake up when the current feeds go stale
+            age = (datetime.utcnow() - self.built_at).total_seconds() if self.built_at else 0
+            await asyncio.sleep(max(1, FEED_REFRESH_SECONDS - age))
+    
+    def start(self):
+        """Start the background feed builder."""
+        if not self.task:
+            self.task = asyncio.create_task(self._refresh_loop())
+    
+    async def stop(self):
+        """Stop the background feed builder."""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get feed statistics."""
+        return {
+            "feeds": len(self.feeds),
+            "builds": self.builds,
+            "built_at": self.built_at.isoformat() if self.built_at else None
+        }
+
+feed_builder = FeedBuilder()
@@ -0,0 +1,272 @@
+from bisect import bisect_left
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Callable
+from dotenv import load_dotenv
+from pathlib import Path
+import asyncio
+import os
+import time
+import logging
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env', override=True)
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics; when disabled no middleware, listeners or monitor tasks are installed
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CACHE_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+CACHE_COUNTERS = ("hits", "misses", "stale", "evictions", "expirations")
+
+class Histogram:
+    """Fixed-bucket latency histogram."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, value: float):
+        """Record one observation."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+    
+    def merge(self, other: "Histogram"):
+        """Add another histogram's observations (same buckets) into this one."""
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Get cumulative bucket counts, Prometheus style."""
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += bucket_count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "buckets": buckets
+        }
+
+class CacheStats:
+    """Hit/miss/stale/eviction counters and lookup latency for one cache tier, per namespace.
+    
+    Stale serves count as hits as well, so hit rates reflect requests answered
+    without going upstream.
+    """
+    
+    def __init__(self):
+        self.counters: Dict[str, Dict[str, int]] = {}
+        self.latency: Dict[str, Histogram] = {}
+        # Changes since the last take_deltas(), for aggregation across workers
+        self.pending_counters: Dict[str, Dict[str, int]] = {}
+        self.pending_latency: Dict[str, Histogram] = {}
+    
+    def incr(self, namespace: str, counter: str, amount: int = 1):
+        """Increment a counter for a namespace."""
+        for counters in (self.counters, self.pending_counters):
+            namespace_counters = counters.setdefault(namespace, dict.fromkeys(CACHE_COUNTERS, 0))
+            namespace_counters[counter] = namespace_counters.get(counter, 0) + amount
+    
+    def observe(self, namespace: str, seconds: float):
+        """Record the latency of one lookup."""
+        for latency in (self.latency, self.pending_latency):
+            if namespace not in latency:
+                latency[namespace] = Histogram(CACHE_LATENCY_BUCKETS)
+            latency[namespace].observe(seconds)
+    
+    def take_deltas(self) -> Tuple[Dict[str, Dict[str, int]], Dict[str, Histogram]]:
+        """Get and reset the changes since the last call."""
+        deltas = (self.pending_counters, self.pending_latency)
+        self.pending_counters, self.pending_latency = {}, {}
+        return deltas
+    
+    def restore_deltas(self, namespace: str, counters: Dict[str, int], latency: Optional[Histogram]):
+        """Put back a namespace's taken deltas that could not be stored, so the next flush retries them."""
+        pending = self.pending_counters.setdefault(namespace, dict.fromkeys(CACHE_COUNTERS, 0))
+        for counter, amount in counters.items():
+            pending[counter] = pending.get(counter, 0) + amount
+        if latency:
+            if namespace not in self.pending_latency:
+                self.pending_latency[namespace] = Histogram(CACHE_LATENCY_BUCKETS)
+            self.pending_latency[namespace].merge(latency)
+    
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Get this worker's counters and latency per namespace."""
+        snapshot = {}
+        for namespace, counters in self.counters.items():
+            snapshot[namespace] = dict(counters)
+            if namespace in self.latency:
+                snapshot[namespace]["latency_seconds"] = self.latency[namespace].snapshot()
+        return snapshot
+
+# Cache statistics by tier (l1, l2, mongo, search)
+cache_stats: Dict[str, CacheStats] = {}
+
+def get_cache_stats(tier: str) -> CacheStats:
+    """Get the statistics for a cache tier, creating them on first use."""
+    if tier not in cache_stats:
+        cache_stats[tier] = CacheStats()
+    return cache_stats[tier]
+
+def hit_rate(counters: Dict[str, int]) -> float:
+    """Get hits / lookups for a counter set."""
+    lookups = counters.get("hits", 0) + counters.get("misses", 0)
+    return round(counters.get("hits", 0) / lookups, 4) if lookups else 0.0
+
+def escape_label(value: Any) -> str:
+    """Escape a Prometheus label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names: Sequence[str], values: Sequence[Any], **extra: str) -> str:
+    """Format a Prometheus label set."""
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in list(zip(names, values)) + list(extra.items())]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class LabeledHistogram:
+    """A histogram per label value combination."""
+    
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.series: Dict[Tuple[str, ...], Histogram] = {}
+    
+    def observe(self, labels: Tuple[str, ...], value: float):
+        """Record one observation for a label value tuple."""
+        histogram = self.series.get(labels)
+        if histogram is None:
+            histogram = self.series[labels] = Histogram(self.buckets)
+        histogram.observe(value)
+    
+    def render(self) -> List[str]:
+        """Render in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, histogram in list(self.series.items()):
+            snapshot = histogram.snapshot()
+            for bound, cumulative in snapshot["buckets"].items():
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, labels, le=bound)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {histogram.sum}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {histogram.count}")
+        return lines
+
+class MetricsRegistry:
+    """Process-wide histograms plus the event loop lag monitor."""
+    
+    def __init__(self):
+        self.histograms: Dict[str, LabeledHistogram] = {}
+        # Callbacks rendering counters and gauges that live on other objects
+        self.collectors: List[Callable[[], List[str]]] = []
+        self.loop_lag_task: Optional[asyncio.Task] = None
+    
+    def histogram(self, name: str, description: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> LabeledHistogram:
+        """Get a histogram, registering it on first use."""
+        if name not in self.histograms:
+            self.histograms[name] = LabeledHistogram(name, description, label_names, buckets)
+        return self.histograms[name]
+    
+    def collector(self, render: Callable[[], List[str]]):
+        """Register a callback returning extra Prometheus text lines."""
+        self.collectors.append(render)
+    
+    def _render_cache_stats(self) -> List[str]:
+        """Render this worker's cache counters."""
+        name = "cache_events_total"
+        lines = [f"# HELP {name} Cache lookups and removals by tier, namespace and event", f"# TYPE {name} counter"]
+        for tier, stats in list(cache_stats.items()):
+            for namespace, counters in list(stats.counters.items()):
+                for event, value in counters.items():
+                    lines.append(f"{name}{format_labels(('tier', 'namespace', 'event'), (tier, namespace, event))} {value}")
+        return lines
+    
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format."""
+        lines = []
+        for histogram in list(self.histograms.values()):
+            lines.extend(histogram.render())
+        lines.extend(self._render_cache_stats())
+        for render in self.collectors:
+            lines.extend(render())
+        return "\n".join(lines) + "\n"
+    
+    async def _loop_lag_monitor(self):
+        """Measure how late the event loop wakes a sleeping task."""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + EVENT_LOOP_LAG_INTERVAL
+            await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL)
+            event_loop_lag.observe((), max(0.0, loop.time() - expected))
+    
+    def start_loop_monitor(self):
+        """Start the event loop lag monitor."""
+        if not self.loop_lag_task:
+            self.loop_lag_task = asyncio.create_task(self._loop_lag_monitor())
+    
+    async def stop_loop_monitor(self):
+        """Stop the event loop lag monitor."""
+        if self.loop_lag_task:
+            self.loop_lag_task.cancel()
+            try:
+                await self.loop_lag_task
+            except asyncio.CancelledError:
+                pass
+            self.loop_lag_task = None
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "API request latency by route template", ("method", "route", "status")
+)
+mongo_command_duration = registry.histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ("command", "collection", "outcome"),
+    buckets=CACHE_LATENCY_BUCKETS
+)
+upstream_request_duration = registry.histogram(
+    "upstream_request_duration_seconds", "Upstream HTTP request latency by host", ("host", "status")
+)
+event_loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "Event loop scheduling delay", buckets=CACHE_LATENCY_BUCKETS
+)
+password_hash_duration = registry.histogram(
+    "password_hash_duration_seconds", "bcrypt hash/verify latency on the worker pool, including queueing", ("operation",)
+)
+
+class MetricsMiddleware:
+    """ASGI middleware timing requests that match a route under the given prefix."""
+    
+    def __init__(self, app, prefix: str = "/api"):
+        self.app = app
+        self.prefix = prefix
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start = time.perf_counter()
+        status_code = 500
+        
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope; label by its template to bound cardinality
+            route = getattr(scope.get("route"), "path", None)
+            if route and route.startswith(self.prefix):
+                http_request_duration.observe((scope["method"], route, str(status_code)), time.perf_counter() - start)
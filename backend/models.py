@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr
+from dataclasses import dataclass, field, fields
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from bson import ObjectId
@@ -54,23 +55,6 @@ class TokenData(BaseModel):
     username: Optional[str] = None
 
 # Movie/TV Models
-class WatchHistoryItem(BaseModel):
-    movie_id: str
-    tmdb_id: int
-    title: str
-    poster_path: Optional[str]
-    watched_at: datetime = Field(default_factory=datetime.utcnow)
-    progress: Optional[float] = 0.0  # 0.0 to 1.0
-    type: str = "movie"  # movie or tv
-
-class FavoriteItem(BaseModel):
-    movie_id: str
-    tmdb_id: int
-    title: str
-    poster_path: Optional[str]
-    added_at: datetime = Field(default_factory=datetime.utcnow)
-    type: str = "movie"
-
 class Genre(BaseModel):
     id: int
     name: str
@@ -120,6 +104,88 @@ class StreamResponse(BaseModel):
         populate_by_name = True
         arbitrary_types_allowed = True
 
+# List Card Models
+# Plain slotted dataclasses built straight from projected Mongo docs, skipping
+# Pydantic validation; list endpoints return these and only the detail
+# endpoint materializes a full MovieMetadata. MovieCard drops overview,
+# backdrop_path, vote_count, runtime, season/episode counts, adult,
+# original_language, popularity and the cache timestamps of the full document.
+@dataclass(slots=True)
+class MovieCard:
+    id: Optional[str]
+    tmdb_id: int
+    title: str
+    poster_path: Optional[str] = None
+    release_date: Optional[str] = None
+    first_air_date: Optional[str] = None
+    genres: List[Dict[str, Any]] = field(default_factory=list)
+    vote_average: float = 0.0
+    type: str = "movie"
+    
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> "MovieCard":
+        return cls(
+            str(doc["_id"]) if doc.get("_id") is not None else None,
+            doc["tmdb_id"],
+            doc.get("title", ""),
+            doc.get("poster_path"),
+            doc.get("release_date"),
+            doc.get("first_air_date"),
+            doc.get("genres") or [],
+            float(doc.get("vote_average") or 0.0),
+            doc.get("type") or "movie"
+        )
+
+@dataclass(slots=True)
+class FavoriteCard:
+    movie_id: str
+    tmdb_id: int
+    title: str
+    poster_path: Optional[str]
+    added_at: datetime
+    type: str = "movie"
+    
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> "FavoriteCard":
+        return cls(
+            doc["movie_id"],
+            doc["tmdb_id"],
+            doc["title"],
+            doc.get("poster_path"),
+            doc["added_at"],
+            doc.get("type") or "movie"
+        )
+
+@dataclass(slots=True)
+class WatchHistoryCard:
+    movie_id: str
+    tmdb_id: int
+    title: str
+    poster_path: Optional[str]
+    watched_at: datetime
+    progress: Optional[float] = 0.0
+    type: str = "movie"
+    
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> "WatchHistoryCard":
+        return cls(
+            doc["movie_id"],
+            doc["tmdb_id"],
+            doc["title"],
+            doc.get("poster_path"),
+            doc["watched_at"],
+            doc.get("progress", 0.0),
+            doc.get("type") or "movie"
+        )
+
+def card_json(card: Any) -> Dict[str, Any]:
+    """Get a card's JSON fields; MovieCard's id goes out as "_id", like the list endpoints always returned it."""
+    return {("_id" if name == "id" else name): getattr(card, name) for name in card.__slots__}
+
+def card_projection(card: type) -> Dict[str, int]:
+    """Get the Mongo projection that fetches only a card's fields (_id is always returned)."""
+    return {card_field.name: 1 for card_field in fields(card) if card_field.name != "id"}
+
 # API Response Models
 class PaginatedResponse(BaseModel):
     page: int = 1
@@ -147,6 +213,9 @@ class FavoriteRequest(BaseModel):
     poster_path: Optional[str] = None
     type: str = "movie"
 
+class MovieBatchRequest(BaseModel):
+    tmdb_ids: List[int] = Field(..., min_length=1)
+
 class WatchHistoryRequest(BaseModel):
     tmdb_id: int
     title: str
@@ -154,14 +223,7 @@ class WatchHistoryRequest(BaseModel):
     progress: Optional[float] = 0.0
     type: str = "movie"
 
-# Admin Models
-class SystemStats(BaseModel):
-    total_users: int
-    total_movies_cached: int
-    total_streams_cached: int
-    cache_hit_rate: float
-    active_users_today: int
-
+# Response Envelope
 class APIResponse(BaseModel):
     success: bool = True
     message: str = "Success"
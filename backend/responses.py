@@ -0,0 +1,39 @@
+from fastapi.responses import Response
+from pydantic import BaseModel
+from bson import ObjectId
+from dataclasses import is_dataclass
+from typing import Any, Optional
+import orjson
+
+from models import card_json
+
+def json_default(obj: Any) -> Any:
+    """Encode types orjson doesn't know, the way FastAPI's response_model serialization does."""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(by_alias=True)
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if is_dataclass(obj):
+        return card_json(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class FastJSONResponse(Response):
+    """JSON response rendered straight to bytes by orjson."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        # List cards go through json_default so MovieCard keeps its "_id" key
+        return orjson.dumps(content, default=json_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATACLASS)
+
+def api_response(data: Any = None, message: str = "Success", success: bool = True, error: Optional[str] = None) -> FastJSONResponse:
+    """Build an APIResponse-shaped body without re-validating it against the response model.
+
+    Returning a Response from a handler skips FastAPI's response_model validation and
+    jsonable_encoder pass, so hot read paths serialize their data exactly once.
+    """
+    return FastJSONResponse({
+        "success": success,
+        "message": message,
+        "data": data,
+        "error": error
+    })
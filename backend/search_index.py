@@ -0,0 +1,518 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Set, FrozenSet, Tuple
+from dotenv import load_dotenv
+from pathlib import Path
+import asyncio
+import bisect
+import heapq
+import math
+import os
+import re
+import time
+import unicodedata
+import logging
+
+from database import db_service, movie_stale_cutoff
+from metrics import get_cache_stats
+from models import MovieCard, card_projection
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env', override=True)
+
+logger = logging.getLogger(__name__)
+
+# Search ranking: minimum share of query trigrams a title must contain, and how much popularity counts
+SEARCH_MIN_SIMILARITY = float(os.getenv("SEARCH_MIN_SIMILARITY", "0.45"))
+SEARCH_POPULARITY_WEIGHT = float(os.getenv("SEARCH_POPULARITY_WEIGHT", "0.2"))
+SEARCH_INDEX_LOAD_BATCH = 1000
+
+# Typeahead: suggestions kept per prefix, and how wide a prefix range may be before its top list is kept
+SUGGEST_TOP_K = int(os.getenv("SUGGEST_TOP_K", "10"))
+SUGGEST_SCAN_LIMIT = int(os.getenv("SUGGEST_SCAN_LIMIT", "64"))
+SUGGEST_MAX_WORDS = 6
+
+# Search result cache: TTLs in seconds for results and for empty results, and max cached pages
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "600"))
+SEARCH_CACHE_NEGATIVE_TTL = int(os.getenv("SEARCH_CACHE_NEGATIVE_TTL", "60"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "5000"))
+
+def normalize_title(title: str) -> str:
+    """Lowercase, strip accents and punctuation, and collapse whitespace."""
+    text = unicodedata.normalize("NFKD", title or "")
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", text).split())
+
+def trigrams(text: str, prefix: bool = False) -> FrozenSet[str]:
+    """Get the padded trigrams of normalized text; prefix=True leaves the end open for partial words."""
+    padded = f"  {text}" if prefix else f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def prefix_keys(title: str) -> List[str]:
+    """Get the suggestion keys of a normalized title: the title from each word start on."""
+    words = title.split()[:SUGGEST_MAX_WORDS]
+    return list(dict.fromkeys(" ".join(words[i:]) for i in range(len(words))))
+
+def score_title(text: str, query_grams: FrozenSet[str], title: str, shared: int, popularity: float, max_popularity: float) -> float:
+    """Score a normalized title: shared trigram ratio, prefix/substring bonus and log-scaled popularity."""
+    score = shared / len(query_grams)
+    if title.startswith(text):
+        score += 0.5
+    elif text in title:
+        score += 0.25
+    return score + SEARCH_POPULARITY_WEIGHT * math.log1p(popularity) / math.log1p(max_popularity)
+
+class PrefixIndex:
+    """Sorted array of (key, tmdb_id) with top-K-by-popularity lists for wide prefixes.
+    
+    Narrow prefixes are answered by scanning their bisected range. Prefixes whose
+    range exceeds SUGGEST_SCAN_LIMIT keep a top list, created on first use and
+    updated in place on every add/remove, so any prefix costs at most one small scan.
+    """
+    
+    def __init__(self, popularity: Dict[int, float]):
+        self.popularity = popularity
+        self.entries: List[Tuple[str, int]] = []
+        self.keys: Dict[int, List[str]] = {}
+        self.top: Dict[str, List[int]] = {}
+    
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        return (
+            bisect.bisect_left(self.entries, (prefix,)),
+            bisect.bisect_left(self.entries, (prefix + "\uffff",))
+        )
+    
+    def _rank(self, tmdb_ids) -> List[int]:
+        return heapq.nlargest(SUGGEST_TOP_K, set(tmdb_ids), key=lambda tmdb_id: (self.popularity.get(tmdb_id, 0.0), -tmdb_id))
+    
+    def _rebuild(self, prefix: str):
+        lo, hi = self._range(prefix)
+        self.top[prefix] = self._rank(tmdb_id for _, tmdb_id in self.entries[lo:hi])
+    
+    def _prefixes(self, keys: List[str]) -> Set[str]:
+        return {key[:length] for key in keys for length in range(1, len(key) + 1) if key[:length] in self.top}
+    
+    def add(self, tmdb_id: int, title: str, old_popularity: Optional[float] = None):
+        """Insert or update a title; old_popularity is the previous popularity if it was indexed."""
+        keys = prefix_keys(title)
+        if self.keys.get(tmdb_id) != keys:
+            self.remove(tmdb_id)
+            for key in keys:
+                bisect.insort(self.entries, (key, tmdb_id))
+            self.keys[tmdb_id] = keys
+            old_popularity = None
+        
+        popularity = self.popularity.get(tmdb_id, 0.0)
+        for prefix in self._prefixes(keys):
+            top = self.top[prefix]
+            if tmdb_id in top and old_popularity is not None and popularity < old_popularity:
+                # Something outside the list may now outrank it
+                self._rebuild(prefix)
+            elif tmdb_id in top or len(top) < SUGGEST_TOP_K or popularity > self.popularity.get(top[-1], 0.0):
+                self.top[prefix] = self._rank(top + [tmdb_id])
+    
+    def add_many(self, titles: Dict[int, str]):
+        """Bulk-insert titles with one sort, for the startup load; titles already indexed are kept.
+        
+        Inserting one by one is O(n) per title, which makes a full load quadratic.
+        """
+        entries = []
+        for tmdb_id, title in titles.items():
+            if tmdb_id in self.keys:
+                continue
+            keys = prefix_keys(title)
+            self.keys[tmdb_id] = keys
+            entries.extend((key, tmdb_id) for key in keys)
+        self.entries.extend(entries)
+        self.entries.sort()
+        # Top lists made before the load are missing the new titles; they come back on lookup
+        self.top.clear()
+    
+    def remove(self, tmdb_id: int):
+        """Drop a title, refilling any top list it was in."""
+        keys = self.keys.pop(tmdb_id, None)
+        if not keys:
+            return
+        for key in keys:
+            index = bisect.bisect_left(self.entries, (key, tmdb_id))
+            if index < len(self.entries) and self.entries[index] == (key, tmdb_id):
+                del self.entries[index]
+        for prefix in self._prefixes(keys):
+            if tmdb_id in self.top[prefix]:
+                self._rebuild(prefix)
+    
+    def lookup(self, prefix: str) -> List[int]:
+        """Get the most popular tmdb_ids with a key starting with prefix."""
+        top = self.top.get(prefix)
+        if top is not None:
+            return top
+        lo, hi = self._range(prefix)
+        if hi - lo > SUGGEST_SCAN_LIMIT:
+            self._rebuild(prefix)
+            return self.top[prefix]
+        return self._rank(tmdb_id for _, tmdb_id in self.entries[lo:hi])
+    
+    def warm(self, max_length: int = 2):
+        """Build top lists for all wide prefixes up to max_length, so first keystrokes never scan."""
+        for prefix in {key[:length] for key, _ in self.entries for length in range(1, max_length + 1)}:
+            self.lookup(prefix)
+
+class TitleIndex:
+    """In-memory trigram inverted index over cached movie titles.
+    
+    Kept current through DatabaseService.movie_write_hooks, so every
+    cache_movie/cache_movies_bulk write is searchable right away.
+    """
+    
+    def __init__(self):
+        self.cards: Dict[int, MovieCard] = {}
+        self.titles: Dict[int, str] = {}
+        self.grams: Dict[int, FrozenSet[str]] = {}
+        self.popularity: Dict[int, float] = {}
+        self.expires_at: Dict[int, datetime] = {}
+        self.postings: Dict[str, Set[int]] = {}
+        self.prefixes = PrefixIndex(self.popularity)
+        self.max_popularity = 1.0
+        self.ready = False
+        self.task: Optional[asyncio.Task] = None
+        self.searches = 0
+        self.search_seconds = 0.0
+        self.suggests = 0
+        self.suggest_seconds = 0.0
+    
+    def add(self, movie_doc: Dict[str, Any], index_prefix: bool = True):
+        """Index or re-index one movie doc; index_prefix=False leaves the typeahead entry to the caller."""
+        tmdb_id = movie_doc["tmdb_id"]
+        if "_id" not in movie_doc and tmdb_id in self.cards:
+            # Bulk updates of existing docs don't return _id; keep the one we have
+            movie_doc = {**movie_doc, "_id": self.cards[tmdb_id].id}
+        
+        title = normalize_title(movie_doc.get("title", ""))
+        grams = trigrams(title)
+        old_grams = self.grams.get(tmdb_id, frozenset())
+        for gram in old_grams - grams:
+            postings = self.postings.get(gram)
+            if postings:
+                postings.discard(tmdb_id)
+                if not postings:
+                    del self.postings[gram]
+        for gram in grams - old_grams:
+            self.postings.setdefault(gram, set()).add(tmdb_id)
+        
+        old_popularity = self.popularity.get(tmdb_id)
+        self.cards[tmdb_id] = MovieCard.from_doc(movie_doc)
+        self.titles[tmdb_id] = title
+        self.grams[tmdb_id] = grams
+        self.popularity[tmdb_id] = float(movie_doc.get("popularity") or 0.0)
+        self.expires_at[tmdb_id] = movie_doc["expires_at"]
+        self.max_popularity = max(self.max_popularity, self.popularity[tmdb_id])
+        if index_prefix:
+            self.prefixes.add(tmdb_id, title, old_popularity)
+    
+    def add_docs(self, movie_docs: List[Dict[str, Any]]):
+        """Index a batch of written movie docs (the database write hook)."""
+        for movie_doc in movie_docs:
+            self.add(movie_doc)
+    
+    def remove_deleted(self, tmdb_ids: List[int], cutoff: datetime):
+        """Drop movies deleted from the cache (the database delete hook), unless rewritten since."""
+        for tmdb_id in tmdb_ids:
+            expires_at = self.expires_at.get(tmdb_id)
+            if expires_at is not None and expires_at < cutoff:
+                self.remove(tmdb_id)
+    
+    def remove(self, tmdb_id: int):
+        """Drop a movie from the index."""
+        self.prefixes.remove(tmdb_id)
+        for gram in self.grams.pop(tmdb_id, frozenset()):
+            postings = self.postings.get(gram)
+            if postings:
+                postings.discard(tmdb_id)
+                if not postings:
+                    del self.postings[gram]
+        for entries in (self.cards, self.titles, self.popularity, self.expires_at):
+            entries.pop(tmdb_id, None)
+    
+    def search(self, query: str, page: int = 1, limit: int = 20) -> Dict[str, Any]:
+        """Rank titles by trigram similarity, prefix/substring matches and popularity."""
+        start = time.perf_counter()
+        text = normalize_title(query)
+        query_grams = trigrams(text, prefix=True) if text else frozenset()
+        
+        # Count shared trigrams per candidate straight from the postings
+        shared: Dict[int, int] = {}
+        for gram in query_grams:
+            for tmdb_id in self.postings.get(gram, ()):
+                shared[tmdb_id] = shared.get(tmdb_id, 0) + 1
+        
+        # Expired titles stay searchable while the detail endpoint still serves them
+        cutoff = movie_stale_cutoff(datetime.utcnow())
+        min_shared = SEARCH_MIN_SIMILARITY * len(query_grams)
+        ranked = []
+        for tmdb_id, count in shared.items():
+            if count < min_shared or self.expires_at[tmdb_id] <= cutoff:
+                continue
+            score = score_title(text, query_grams, self.titles[tmdb_id], count, self.popularity[tmdb_id], self.max_popularity)
+            ranked.append((score, tmdb_id))
+        
+        ranked.sort(reverse=True)
+        offset = (page - 1) * limit
+        results = [self.cards[tmdb_id] for _, tmdb_id in ranked[offset:offset + limit]]
+        
+        self.searches += 1
+        self.search_seconds += time.perf_counter() - start
+        return {
+            "page": page,
+            "total_pages": (len(ranked) // limit) + (1 if len(ranked) % limit else 0),
+            "total_results": len(ranked),
+            "results": results
+        }
+    
+    def merge(self, query: str, cards: List[MovieCard], movie_docs: List[Dict[str, Any]], limit: int = 20) -> List[MovieCard]:
+        """Merge cached result cards with fresh movie docs, deduplicated by tmdb_id and ranked like search."""
+        text = normalize_title(query)
+        query_grams = trigrams(text, prefix=True) if text else frozenset()
+        candidates = {card.tmdb_id: (card, self.popularity.get(card.tmdb_id, 0.0)) for card in cards}
+        for movie_doc in movie_docs:
+            tmdb_id = movie_doc["tmdb_id"]
+            if tmdb_id not in candidates:
+                # Reuse the indexed card, with its _id, when the title is already cached
+                card = self.cards.get(tmdb_id) or MovieCard.from_doc(movie_doc)
+                candidates[tmdb_id] = (card, float(movie_doc.get("popularity") or 0.0))
+        if not query_grams:
+            return [card for card, _ in candidates.values()][:limit]
+        
+        max_popularity = max([self.max_popularity] + [popularity for _, popularity in candidates.values()])
+        ranked = []
+        for order, (card, popularity) in enumerate(candidates.values()):
+            title = normalize_title(card.title)
+            shared = len(query_grams & trigrams(title))
+            ranked.append((-score_title(text, query_grams, title, shared, popularity, max_popularity), order, card))
+        ranked.sort(key=lambda entry: entry[:2])
+        return [card for _, _, card in ranked[:limit]]
+    
+    def suggest(self, query: str, limit: int = SUGGEST_TOP_K) -> List[MovieCard]:
+        """Get the most popular servable titles with a word starting with the query."""
+        start = time.perf_counter()
+        prefix = normalize_title(query)
+        results = []
+        if prefix:
+            cutoff = movie_stale_cutoff(datetime.utcnow())
+            results = [
+                self.cards[tmdb_id] for tmdb_id in self.prefixes.lookup(prefix)
+                if self.expires_at[tmdb_id] > cutoff
+            ][:limit]
+        
+        self.suggests += 1
+        self.suggest_seconds += time.perf_counter() - start
+        return results
+    
+    async def load(self):
+        """Index every servable cached movie, yielding to the event loop between batches."""
+        started = time.perf_counter()
+        projection = {**card_projection(MovieCard), "popularity": 1, "expires_at": 1}
+        count = 0
+        loaded: Dict[int, str] = {}
+        async for movie_doc in db_service.db.movies.find({"expires_at": {"$gt": movie_stale_cutoff(datetime.utcnow())}}, projection):
+            movie_doc["_id"] = str(movie_doc["_id"])
+            self.add(movie_doc, index_prefix=False)
+            loaded[movie_doc["tmdb_id"]] = self.titles[movie_doc["tmdb_id"]]
+            count += 1
+            if count % SEARCH_INDEX_LOAD_BATCH == 0:
+                await asyncio.sleep(0)
+        
+        # One sort instead of an insort per title
+        self.prefixes.add_many(loaded)
+        await asyncio.sleep(0)
+        self.prefixes.warm()
+        self.ready = True
+        logger.info(f"Search index loaded {count} titles in {time.perf_counter() - started:.2f}s")
+    
+    async def _load_safely(self):
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error(f"Search index load failed: {str(e)}")
+    
+    def start(self):
+        """Start following movie writes and deletes, and load existing titles in the background."""
+        if self.add_docs not in db_service.movie_write_hooks:
+            db_service.movie_write_hooks.append(self.add_docs)
+        if self.remove_deleted not in db_service.movie_delete_hooks:
+            db_service.movie_delete_hooks.append(self.remove_deleted)
+        if not self.task:
+            self.task = asyncio.create_task(self._load_safely())
+    
+    async def stop(self):
+        """Stop the background load."""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index statistics."""
+        return {
+            "ready": self.ready,
+            "titles": len(self.cards),
+            "trigrams": len(self.postings),
+            "searches": self.searches,
+            "avg_search_ms": round(self.search_seconds / self.searches * 1000, 4) if self.searches else 0.0,
+            "suggest_prefixes": len(self.prefixes.top),
+            "suggests": self.suggests,
+            "avg_suggest_ms": round(self.suggest_seconds / self.suggests * 1000, 4) if self.suggests else 0.0
+        }
+
+class SearchCache:
+    """In-process LRU cache of search result pages, keyed by normalized query and page.
+    
+    Cached queries are indexed by trigram, so caching a new title drops every
+    query whose results it could join, using the same match rule as
+    TitleIndex.search. Refreshes of titles the index already serves are skipped.
+    Writes and deletes only reach the worker that made them, so with several
+    workers the others may serve stale pages for up to SEARCH_CACHE_TTL.
+    """
+    
+    def __init__(self, index: TitleIndex, max_entries: int = SEARCH_CACHE_MAX_ENTRIES):
+        self.index = index
+        self.max_entries = max_entries
+        # (normalized query, page) -> (results, expires_at, tmdb_ids on the page)
+        self.entries: "OrderedDict[Tuple[str, int], Tuple[Dict[str, Any], float, FrozenSet[int]]]" = OrderedDict()
+        self.pages: Dict[str, Set[int]] = {}
+        self.grams: Dict[str, FrozenSet[str]] = {}
+        self.postings: Dict[str, Set[str]] = {}
+        self.stats = get_cache_stats("search")
+        self.negative_hits = 0
+        self.invalidations = 0
+    
+    def get(self, query: str, page: int) -> Optional[Dict[str, Any]]:
+        """Get a copy of the cached results for a query page."""
+        key = (normalize_title(query), page)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats.incr("results", "misses")
+            return None
+        
+        if entry[1] <= time.monotonic():
+            self._remove(key)
+            self.stats.incr("results", "expirations")
+            self.stats.incr("results", "misses")
+            return None
+        
+        self.entries.move_to_end(key)
+        self.stats.incr("results", "hits")
+        if not entry[0]["results"]:
+            self.negative_hits += 1
+        return dict(entry[0])
+    
+    def set(self, query: str, page: int, results: Dict[str, Any]):
+        """Cache a results page; empty results get the short negative TTL."""
+        text = normalize_title(query)
+        if not text:
+            return
+        
+        key = (text, page)
+        if key in self.entries:
+            self._remove(key)
+        while len(self.entries) >= self.max_entries:
+            self._remove(next(iter(self.entries)))
+            self.stats.incr("results", "evictions")
+        
+        ttl = SEARCH_CACHE_TTL if results["results"] else SEARCH_CACHE_NEGATIVE_TTL
+        tmdb_ids = frozenset(card.tmdb_id for card in results["results"])
+        self.entries[key] = (dict(results), time.monotonic() + ttl, tmdb_ids)
+        if text not in self.pages:
+            self.pages[text] = set()
+            self.grams[text] = trigrams(text, prefix=True)
+            for gram in self.grams[text]:
+                self.postings.setdefault(gram, set()).add(text)
+        self.pages[text].add(page)
+    
+    def _remove(self, key: Tuple[str, int]):
+        del self.entries[key]
+        text, page = key
+        pages = self.pages[text]
+        pages.discard(page)
+        if not pages:
+            del self.pages[text]
+            for gram in self.grams.pop(text):
+                queries = self.postings[gram]
+                queries.discard(text)
+                if not queries:
+                    del self.postings[gram]
+    
+    def is_new(self, movie_doc: Dict[str, Any], cutoff: datetime) -> bool:
+        """Whether a written movie can change search results: unindexed, too stale there, or retitled."""
+        tmdb_id = movie_doc["tmdb_id"]
+        return (
+            tmdb_id not in self.index.cards
+            or self.index.expires_at[tmdb_id] <= cutoff
+            or self.index.titles[tmdb_id] != normalize_title(movie_doc.get("title", ""))
+        )
+    
+    def invalidate_docs(self, movie_docs: List[Dict[str, Any]]):
+        """Drop cached queries that newly cached movies match (the database write hook).
+        
+        Runs before the title index's hook, so the index still shows what was cached before.
+        """
+        cutoff = movie_stale_cutoff(datetime.utcnow())
+        for movie_doc in movie_docs:
+            if not self.is_new(movie_doc, cutoff):
+                continue
+            
+            shared: Dict[str, int] = {}
+            for gram in trigrams(normalize_title(movie_doc.get("title", ""))):
+                for text in self.postings.get(gram, ()):
+                    shared[text] = shared.get(text, 0) + 1
+            for text, count in shared.items():
+                if count < SEARCH_MIN_SIMILARITY * len(self.grams[text]):
+                    continue
+                # Pages that already show the title, like a search's own merged
+                # TMDB results being written back, are still correct
+                stale_pages = [page for page in self.pages[text] if movie_doc["tmdb_id"] not in self.entries[(text, page)][2]]
+                if stale_pages:
+                    self.invalidations += 1
+                for page in stale_pages:
+                    self._remove((text, page))
+    
+    def invalidate_deleted(self, tmdb_ids: List[int], cutoff: datetime):
+        """Drop cached pages showing movies deleted from the cache (the database delete hook)."""
+        # Titles the index holds with a later expiry were rewritten after the delete's read
+        deleted = frozenset(
+            tmdb_id for tmdb_id in tmdb_ids
+            if self.index.expires_at.get(tmdb_id, cutoff - timedelta(seconds=1)) < cutoff
+        )
+        for key in [key for key, entry in self.entries.items() if entry[2] & deleted]:
+            self._remove(key)
+            self.invalidations += 1
+    
+    def clear(self):
+        """Remove every entry."""
+        self.entries.clear()
+        self.pages.clear()
+        self.grams.clear()
+        self.postings.clear()
+    
+    def start(self):
+        """Start following movie writes, ahead of the title index's hook."""
+        if self.invalidate_docs not in db_service.movie_write_hooks:
+            db_service.movie_write_hooks.insert(0, self.invalidate_docs)
+        if self.invalidate_deleted not in db_service.movie_delete_hooks:
+            db_service.movie_delete_hooks.append(self.invalidate_deleted)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        return {
+            "entries": len(self.entries),
+            "queries": len(self.pages),
+            "negative_hits": self.negative_hits,
+            "invalidations": self.invalidations,
+            "counters": self.stats.snapshot().get("results", {})
+        }
+
+title_index = TitleIndex()
+search_cache = SearchCache(title_index)
@@ -1,6 +1,7 @@
 from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, Query, BackgroundTasks, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
@@ -18,7 +19,12 @@ import asyncio
 from models import *
 from auth import *
 from external_apis import *
-from database import db_service
+from database import db_service, MOVIE_CACHE_MAX_STALE
+from feeds import feed_builder, movies_feed_key, TRENDING_FEED_KEY
+from metrics import registry, MetricsMiddleware, METRICS_ENABLED
+from responses import api_response
+from search_index import title_index, search_cache, SUGGEST_TOP_K
+from warmer import cache_warmer
 
 ROOT_DIR = Path(__file__).parent
 env_file = ROOT_DIR / '.env'
@@ -46,8 +52,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Rate limiting
-limiter = Limiter(key_func=get_remote_address)
+# Stale movie docs are revalidated in the background, a few at a time
+MOVIE_REFRESH_CONCURRENCY = int(os.getenv("MOVIE_REFRESH_CONCURRENCY", "5"))
+
+# POST /api/movies/batch: ids per request and concurrent TMDB fetches for cache misses
+MOVIE_BATCH_MAX_IDS = int(os.getenv("MOVIE_BATCH_MAX_IDS", "50"))
+MOVIE_BATCH_FETCH_CONCURRENCY = int(os.getenv("MOVIE_BATCH_FETCH_CONCURRENCY", "5"))
+
+# Rate limiting (disable for load tests, which send everything from one address)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"
+limiter = Limiter(key_func=get_remote_address, enabled=RATE_LIMIT_ENABLED)
 
 # Create the main app
 app = FastAPI(
@@ -73,6 +87,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency histograms; skipped entirely when metrics are disabled
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, prefix="/api")
+
 # Create API router with prefix
 api_router = APIRouter(prefix="/api")
 
@@ -89,25 +107,29 @@ async def get_current_user_with_db(
 ) -> User:
     """Get current user with database dependency."""
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        token = credentials.credentials
+        user = get_cached_principal(token)
         
-        user_doc = await db.users.find_one({"username": username})
-        if not user_doc:
-            raise HTTPException(status_code=401, detail="User not found")
-        
-        # Convert ObjectId to string
-        user_doc["_id"] = str(user_doc["_id"])
+        if not user:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise HTTPException(status_code=401, detail="Invalid token")
+            
+            user_doc = await db.users.find_one({"username": username})
+            if not user_doc:
+                raise HTTPException(status_code=401, detail="User not found")
+            
+            # Convert ObjectId to string
+            user_doc["_id"] = str(user_doc["_id"])
+            
+            user = User(**user_doc)
+            cache_principal(token, user, payload.get("exp"))
         
-        # Update last login
-        await db.users.update_one(
-            {"username": username},
-            {"$set": {"last_login": datetime.utcnow()}}
-        )
+        # Update last login (batched and throttled)
+        db_service.record_user_activity(user.username)
         
-        return User(**user_doc)
+        return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.JWTError as e:
@@ -123,34 +145,52 @@ async def get_current_admin_user_with_db(current_user: User = Depends(get_curren
         raise HTTPException(status_code=403, detail="Not enough permissions")
     return current_user
 
-# Helper function to normalize movie data
-def normalize_movie_data(movie_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Normalize movie data from TMDB."""
-    # Handle both movie and TV data structures
-    title = movie_data.get("title") or movie_data.get("name", "")
-    media_type = "tv" if "first_air_date" in movie_data else "movie"
+async def fetch_and_cache_movie(movie_id: int, refresh: bool = False) -> Optional[MovieMetadata]:
+    """Fetch movie/TV metadata from TMDB and cache it."""
+    movie_data = await resolve_movie_metadata(movie_id, refresh)
     
-    return {
-        "id": movie_data.get("id"),
-        "tmdb_id": movie_data.get("id"),  # Make sure tmdb_id is set
-        "title": title,
-        "overview": movie_data.get("overview", ""),
-        "poster_path": f"https://image.tmdb.org/t/p/w500{movie_data['poster_path']}" if movie_data.get("poster_path") else None,
-        "backdrop_path": f"https://image.tmdb.org/t/p/w1280{movie_data['backdrop_path']}" if movie_data.get("backdrop_path") else None,
-        "release_date": movie_data.get("release_date") or movie_data.get("first_air_date"),
-        "first_air_date": movie_data.get("first_air_date"),
-        "genres": [{"id": g["id"], "name": g["name"]} for g in movie_data.get("genres", [])],
-        "vote_average": movie_data.get("vote_average", 0.0),
-        "vote_count": movie_data.get("vote_count", 0),
-        "runtime": movie_data.get("runtime"),
-        "number_of_seasons": movie_data.get("number_of_seasons"),
-        "number_of_episodes": movie_data.get("number_of_episodes"),
-        "type": media_type,
-        "adult": movie_data.get("adult", False),
-        "original_language": movie_data.get("original_language", "en"),
-        "popularity": movie_data.get("popularity", 0.0),
-        "year": (movie_data.get("release_date") or movie_data.get("first_air_date", ""))[:4] if (movie_data.get("release_date") or movie_data.get("first_air_date")) else None
+    if not movie_data:
+        return None
+    
+    normalized_data = normalize_movie_data(movie_data)
+    return await db_service.cache_movie(normalized_data)
+
+# Background metadata refreshes, one per tmdb_id; a batch of stale hits queues
+# behind the shared semaphore instead of fanning out to TMDB all at once
+movie_refresh_tasks: Dict[int, asyncio.Task] = {}
+movie_refresh_semaphore = asyncio.Semaphore(MOVIE_REFRESH_CONCURRENCY)
+
+async def refresh_movie(movie_id: int):
+    """Refresh stale movie metadata in the background."""
+    try:
+        async with movie_refresh_semaphore:
+            # The TMDB response cache shares the movie TTL, so a stale doc's response is stale too
+            await fetch_and_cache_movie(movie_id, refresh=True)
+    except Exception as e:
+        logger.error(f"Background refresh failed for {movie_id}: {str(e)}")
+    finally:
+        movie_refresh_tasks.pop(movie_id, None)
+
+def schedule_movie_refresh(movie_id: int):
+    """Schedule a background refresh unless one is already running."""
+    if movie_id not in movie_refresh_tasks:
+        movie_refresh_tasks[movie_id] = asyncio.create_task(refresh_movie(movie_id))
+
+async def write_search_results(movies_data: List[Dict[str, Any]]):
+    """Cache TMDB search results in one bulk upsert and set each result's Mongo _id."""
+    # Ids of titles the index already holds are known without a read
+    known_ids = {
+        movie_data["id"]: title_index.cards[movie_data["id"]].id
+        for movie_data in movies_data
+        if movie_data["id"] in title_index.cards and title_index.cards[movie_data["id"]].id
     }
+    try:
+        written_ids = await db_service.cache_movies_bulk(movies_data, known_ids=known_ids, read_missing_ids=True)
+    except Exception as e:
+        logger.error(f"Search cache write failed: {str(e)}")
+        written_ids = known_ids
+    for movie_data in movies_data:
+        movie_data["_id"] = written_ids.get(movie_data["id"])
 
 # Authentication Endpoints
 @api_router.post("/auth/register", response_model=APIResponse)
@@ -171,7 +211,7 @@ async def register_user(user_data: UserCreate, request: Request, db = Depends(ge
             )
         
         # Create user
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await password_hasher.hash(user_data.password)
         user_doc = {
             "username": user_data.username,
             "email": user_data.email,
@@ -189,6 +229,8 @@ async def register_user(user_data: UserCreate, request: Request, db = Depends(ge
             data={"user_id": str(result.inserted_id)}
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Registration error: {str(e)}")
         return APIResponse(
@@ -205,7 +247,7 @@ async def login_user(login_data: UserLogin, request: Request, db = Depends(get_d
         # Authenticate user
         user_doc = await db.users.find_one({"username": login_data.username})
         
-        if not user_doc or not verify_password(login_data.password, user_doc["password_hash"]):
+        if not user_doc or not await password_hasher.verify(login_data.password, user_doc["password_hash"]):
             return APIResponse(
                 success=False,
                 message="Incorrect username or password",
@@ -236,6 +278,8 @@ async def login_user(login_data: UserLogin, request: Request, db = Depends(get_d
             data=token_data.dict()
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Login error: {str(e)}")
         return APIResponse(
@@ -263,10 +307,25 @@ async def get_movies(
     type_filter: Optional[str] = Query(None, alias="type"),
     genre: Optional[str] = Query(None),
     year: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's next_cursor"),
+    include_total: Optional[bool] = Query(None, description="Count total results (defaults to true without a cursor)"),
     db = Depends(get_db)
 ):
     """Get paginated list of movies and TV shows."""
     try:
+        if include_total is None:
+            include_total = cursor is None
+        
+        # Serve precomputed feed pages when available
+        if not cursor:
+            feed_page = feed_builder.get_page(movies_feed_key(type_filter, genre, year), page)
+            if feed_page:
+                return api_response(
+                    success=True,
+                    message="Movies retrieved successfully",
+                    data=feed_page
+                )
+        
         # Try to get from cache first
         filters = {}
         if type_filter:
@@ -276,10 +335,10 @@ async def get_movies(
         if year:
             filters["year"] = year
         
-        cached_data = await db_service.get_movies_paginated(page, 20, filters)
+        cached_data = await db_service.get_movies_paginated(page, 20, filters, cursor, include_total)
         
-        # If cache is empty or insufficient, fetch from TMDB
-        if not cached_data["results"] or len(cached_data["results"]) < 10:
+        # If cache is empty or insufficient, fetch from TMDB (page-number requests only)
+        if not cursor and (not cached_data["results"] or len(cached_data["results"]) < 10):
             # Fetch popular content from TMDB
             if type_filter == "tv":
                 tmdb_data = await tmdb_service.get_popular_tv(page)
@@ -287,14 +346,14 @@ async def get_movies(
                 tmdb_data = await tmdb_service.get_popular_movies(page)
             
             # Cache the data
-            for movie in tmdb_data.get("results", []):
-                normalized_data = normalize_movie_data(movie)
-                await db_service.cache_movie(normalized_data)
+            await db_service.cache_movies_bulk([
+                normalize_movie_data(movie) for movie in tmdb_data.get("results", [])
+            ])
             
             # Get updated cache
-            cached_data = await db_service.get_movies_paginated(page, 20, filters)
+            cached_data = await db_service.get_movies_paginated(page, 20, filters, cursor, include_total)
         
-        return APIResponse(
+        return api_response(
             success=True,
             message="Movies retrieved successfully",
             data=cached_data
@@ -308,40 +367,98 @@ async def get_movies(
             error=str(e)
         )
 
+@api_router.post("/movies/batch", response_model=APIResponse)
+@limiter.limit("60/minute")
+async def get_movies_batch(batch_request: MovieBatchRequest, request: Request, db = Depends(get_db)):
+    """Get details for many movies/TV shows in one call."""
+    try:
+        # Keep the caller's order, without duplicates
+        tmdb_ids = list(dict.fromkeys(batch_request.tmdb_ids))
+        if len(tmdb_ids) > MOVIE_BATCH_MAX_IDS:
+            return APIResponse(
+                success=False,
+                message=f"At most {MOVIE_BATCH_MAX_IDS} ids per batch",
+                error="BATCH_TOO_LARGE"
+            )
+        
+        doc_ids: Dict[int, str] = {}
+        movies = await db_service.get_cached_movies(tmdb_ids, MOVIE_CACHE_MAX_STALE, doc_ids=doc_ids)
+        
+        # Serve stale metadata and revalidate off the request path, like the detail endpoint
+        now = datetime.utcnow()
+        for movie_id, movie in movies.items():
+            if movie.expires_at <= now:
+                schedule_movie_refresh(movie_id)
+        
+        # Fetch the misses from TMDB concurrently, then write them back in one bulk upsert
+        misses = [movie_id for movie_id in tmdb_ids if movie_id not in movies]
+        if misses:
+            semaphore = asyncio.Semaphore(MOVIE_BATCH_FETCH_CONCURRENCY)
+            
+            async def fetch(movie_id: int) -> Dict[str, Any]:
+                async with semaphore:
+                    return await resolve_movie_metadata(movie_id)
+            
+            fetched = await asyncio.gather(*(fetch(movie_id) for movie_id in misses), return_exceptions=True)
+            found = [normalize_movie_data(movie_data) for movie_data in fetched if movie_data and isinstance(movie_data, dict)]
+            if found:
+                # Build the responses from what was written; the ids come from the read above or the upsert
+                expires_at = datetime.utcnow() + timedelta(hours=24)
+                written_ids = await db_service.cache_movies_bulk(found, 24, known_ids=doc_ids)
+                for movie_data in found:
+                    movies[movie_data["id"]] = MovieMetadata(**{
+                        **movie_data,
+                        "id": written_ids.get(movie_data["id"]),
+                        "expires_at": expires_at
+                    })
+        
+        return api_response(
+            success=True,
+            message="Movie details retrieved successfully",
+            data={
+                "results": [movies[movie_id].dict() for movie_id in tmdb_ids if movie_id in movies],
+                "missing": [movie_id for movie_id in tmdb_ids if movie_id not in movies]
+            }
+        )
+        
+    except Exception as e:
+        logger.error(f"Get movies batch error: {str(e)}")
+        return APIResponse(
+            success=False,
+            message="Failed to retrieve movie details",
+            error=str(e)
+        )
+
 @api_router.get("/movies/{movie_id}", response_model=APIResponse)
 @limiter.limit("60/minute")
 async def get_movie_details(movie_id: int, request: Request, db = Depends(get_db)):
     """Get detailed information about a specific movie/TV show."""
     try:
         # Check cache first
-        cached_movie = await db_service.get_cached_movie(movie_id)
+        cached_movie = await db_service.get_cached_movie(movie_id, MOVIE_CACHE_MAX_STALE)
         
         if cached_movie:
-            return APIResponse(
+            # Serve stale metadata right away and revalidate off the request path
+            if cached_movie.expires_at <= datetime.utcnow():
+                schedule_movie_refresh(movie_id)
+            
+            return api_response(
                 success=True,
                 message="Movie details retrieved from cache",
                 data=cached_movie.dict()
             )
         
         # Fetch from TMDB
-        movie_data = await get_movie_metadata(movie_id, "movie")
-        
-        if not movie_data:
-            # Try as TV show
-            movie_data = await get_movie_metadata(movie_id, "tv")
+        cached_movie = await fetch_and_cache_movie(movie_id)
         
-        if not movie_data:
+        if not cached_movie:
             return APIResponse(
                 success=False,
                 message="Movie not found",
                 error="MOVIE_NOT_FOUND"
             )
         
-        # Normalize and cache
-        normalized_data = normalize_movie_data(movie_data)
-        cached_movie = await db_service.cache_movie(normalized_data)
-        
-        return APIResponse(
+        return api_response(
             success=True,
             message="Movie details retrieved successfully",
             data=cached_movie.dict()
@@ -364,16 +481,14 @@ async def get_movie_streams(movie_id: int, request: Request, refresh: bool = Que
         if not refresh:
             cached_streams = await db_service.get_cached_streams(movie_id)
             if cached_streams and cached_streams.sources:
-                return APIResponse(
+                return api_response(
                     success=True,
                     message="Streaming sources retrieved from cache",
                     data=cached_streams.dict()
                 )
         
         # Get movie details for title
-        movie_data = await get_movie_metadata(movie_id, "movie")
-        if not movie_data:
-            movie_data = await get_movie_metadata(movie_id, "tv")
+        movie_data = await resolve_movie_metadata(movie_id)
         
         if not movie_data:
             return APIResponse(
@@ -395,7 +510,7 @@ async def get_movie_streams(movie_id: int, request: Request, refresh: bool = Que
         # Cache the sources
         cached_streams = await db_service.cache_streams(movie_id, sources, 1)  # 1 hour cache
         
-        return APIResponse(
+        return api_response(
             success=True,
             message="Streaming sources retrieved successfully",
             data=cached_streams.dict()
@@ -409,6 +524,24 @@ async def get_movie_streams(movie_id: int, request: Request, refresh: bool = Que
             error=str(e)
         )
 
+@api_router.get("/search/suggest", response_model=APIResponse)
+@limiter.limit("300/minute")
+async def suggest_titles(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=100, description="Title prefix"),
+    limit: int = Query(8, ge=1, le=SUGGEST_TOP_K)
+):
+    """Typeahead suggestions from the in-memory title index; never touches Mongo or TMDB."""
+    return api_response(
+        success=True,
+        message="Suggestions retrieved successfully",
+        data={
+            "query": q,
+            "ready": title_index.ready,
+            "results": title_index.suggest(q, limit)
+        }
+    )
+
 @api_router.get("/search", response_model=APIResponse)
 @limiter.limit("60/minute")
 async def search_content(
@@ -419,41 +552,50 @@ async def search_content(
 ):
     """Search movies and TV shows."""
     try:
-        # Search in cache first
-        cache_results = await db_service.search_movies(q, page)
+        # Repeated queries are answered from memory until a matching title is written
+        cached_results = search_cache.get(q, page)
+        if cached_results is not None:
+            cached_results["query"] = q
+            return api_response(
+                success=True,
+                message="Search completed successfully",
+                data=cached_results
+            )
+        
+        # Search in cache first, through the in-memory title index once it has loaded
+        tmdb_results = None
+        if title_index.ready:
+            cache_results = title_index.search(q, page)
+        else:
+            cache_results = await db_service.search_movies(q, page)
         
-        # If cache results are insufficient, search TMDB
+        # If cache results are insufficient, search TMDB and merge its results in memory
         if not cache_results["results"] or len(cache_results["results"]) < 5:
             tmdb_results = await tmdb_service.search_multi(q, page)
+            tmdb_movies = [
+                normalize_movie_data(movie) for movie in tmdb_results.get("results", [])
+                if movie.get("media_type") in ["movie", "tv"]
+            ]
             
-            # Cache new results
-            for movie in tmdb_results.get("results", []):
-                if movie.get("media_type") in ["movie", "tv"]:
-                    normalized_data = normalize_movie_data(movie)
-                    await db_service.cache_movie(normalized_data)
-            
-            # Get updated cache results
-            cache_results = await db_service.search_movies(q, page)
-            
-            # If still no results, return TMDB results directly
-            if not cache_results["results"]:
-                normalized_results = []
-                for movie in tmdb_results.get("results", []):
-                    if movie.get("media_type") in ["movie", "tv"]:
-                        normalized_results.append(normalize_movie_data(movie))
+            if tmdb_movies:
+                # Written before answering so TMDB-only titles carry their _id like cached ones
+                await write_search_results(tmdb_movies)
                 
                 cache_results = {
-                    "query": q,
                     "page": page,
-                    "total_pages": tmdb_results.get("total_pages", 1),
-                    "total_results": tmdb_results.get("total_results", 0),
-                    "results": normalized_results
+                    "total_pages": max(cache_results["total_pages"], tmdb_results.get("total_pages", 1)),
+                    "total_results": max(cache_results["total_results"], tmdb_results.get("total_results", 0)),
+                    "results": title_index.merge(q, cache_results["results"], tmdb_movies)
                 }
         
         # Add query to results
         cache_results["query"] = q
         
-        return APIResponse(
+        # Don't cache what a failed TMDB call left out
+        if tmdb_results is None or "results" in tmdb_results:
+            search_cache.set(q, page, cache_results)
+        
+        return api_response(
             success=True,
             message="Search completed successfully",
             data=cache_results
@@ -472,18 +614,27 @@ async def search_content(
 async def get_trending_content(request: Request, db = Depends(get_db)):
     """Get trending movies and TV shows."""
     try:
+        # Serve the precomputed feed when available
+        feed_page = feed_builder.get_page(TRENDING_FEED_KEY)
+        if feed_page:
+            return api_response(
+                success=True,
+                message="Trending content retrieved successfully",
+                data=feed_page
+            )
+        
         # Get trending from TMDB
         trending_data = await tmdb_service.get_trending("all", "week")
         
         results = []
         for movie in trending_data.get("results", []):
             if movie.get("media_type") in ["movie", "tv"]:
-                normalized_data = normalize_movie_data(movie)
-                # Cache it
-                await db_service.cache_movie(normalized_data)
-                results.append(normalized_data)
+                results.append(normalize_movie_data(movie))
         
-        return APIResponse(
+        # Cache them in one round trip
+        await db_service.cache_movies_bulk(results)
+        
+        return api_response(
             success=True,
             message="Trending content retrieved successfully",
             data={
@@ -509,7 +660,7 @@ async def get_genres_list(request: Request):
     try:
         genres = await get_genres_list()
         
-        return APIResponse(
+        return api_response(
             success=True,
             message="Genres retrieved successfully",
             data={"genres": genres}
@@ -596,14 +747,19 @@ async def remove_from_favorites(
 async def get_user_favorites(
     request: Request,
     page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's next_cursor"),
+    include_total: Optional[bool] = Query(None, description="Count total results (defaults to true without a cursor)"),
     current_user: User = Depends(get_current_user_with_db),
     db = Depends(get_db)
 ):
     """Get user's favorite movies."""
     try:
-        favorites = await db_service.get_user_favorites(current_user.username, page)
+        if include_total is None:
+            include_total = cursor is None
         
-        return APIResponse(
+        favorites = await db_service.get_user_favorites(current_user.username, page, 20, cursor, include_total)
+        
+        return api_response(
             success=True,
             message="Favorites retrieved successfully",
             data=favorites
@@ -657,14 +813,19 @@ async def add_to_watch_history(
 async def get_watch_history(
     request: Request,
     page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's next_cursor"),
+    include_total: Optional[bool] = Query(None, description="Count total results (defaults to true without a cursor)"),
     current_user: User = Depends(get_current_user_with_db),
     db = Depends(get_db)
 ):
     """Get user's watch history."""
     try:
-        history = await db_service.get_watch_history(current_user.username, page)
+        if include_total is None:
+            include_total = cursor is None
         
-        return APIResponse(
+        history = await db_service.get_watch_history(current_user.username, page, 20, cursor, include_total)
+        
+        return api_response(
             success=True,
             message="Watch history retrieved successfully",
             data=history
@@ -779,9 +940,28 @@ async def root():
 async def health_check():
     return {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": datetime.utcnow().isoformat(),
+        "http_pool": http_client.get_stats(),
+        "upstream_coalescing": upstream_flights.get_stats(),
+        "password_hashing": password_hasher.get_stats(),
+        "feeds": feed_builder.get_stats(),
+        "search_index": title_index.get_stats(),
+        "search_cache": search_cache.get_stats(),
+        "cache_warmer": cache_warmer.get_stats(),
+        "stream_providers": consumet_service.get_stats(),
+        "response_cache": response_cache.get_stats(),
+        "circuit_breakers": {
+            "tmdb": tmdb_breaker.get_stats(),
+            "consumet": consumet_breaker.get_stats()
+        }
     }
 
+# Prometheus metrics
+if METRICS_ENABLED:
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # Startup and shutdown events
 @app.on_event("startup")
 async def startup_event():
@@ -791,6 +971,26 @@ async def startup_event():
     # Connect to database
     await db_service.connect()
     
+    # Open the shared upstream connection pool
+    await http_client.start()
+    
+    # Start the batched last_login and cache metrics writers
+    db_service.start_activity_writer()
+    db_service.start_cache_metrics_writer()
+    
+    # Start materializing home feeds in the background
+    feed_builder.start()
+    
+    # Load the title search index in the background; /api/search uses Mongo until it is ready
+    title_index.start()
+    search_cache.start()
+    
+    # Refresh hot movies and streams ahead of expiry, within the warmer's upstream budget
+    cache_warmer.start()
+    
+    if METRICS_ENABLED:
+        registry.start_loop_monitor()
+    
     # Create admin user if it doesn't exist
     admin_username = os.getenv("ADMIN_USERNAME", "admin")
     admin_password = os.getenv("ADMIN_PASSWORD", "admin123")
@@ -800,7 +1000,7 @@ async def startup_event():
         admin_doc = {
             "username": admin_username,
             "email": f"{admin_username}@onstream.com",
-            "password_hash": get_password_hash(admin_password),
+            "password_hash": await password_hasher.hash(admin_password),
             "is_admin": True,
             "created_at": datetime.utcnow(),
             "last_login": None
@@ -814,7 +1014,15 @@ async def startup_event():
 async def shutdown_event():
     """Clean up resources."""
     logger.info("Shutting down OnStream API...")
+    await feed_builder.stop()
+    await title_index.stop()
+    await cache_warmer.stop()
+    await registry.stop_loop_monitor()
+    await http_client.close()
+    await db_service.stop_activity_writer()
+    await db_service.stop_cache_metrics_writer()
     await db_service.disconnect()
+    password_hasher.shutdown()
     logger.info("OnStream API shut down successfully")
 
 if __name__ == "__main__":
@@ -0,0 +1,264 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any
+from dotenv import load_dotenv
+from pathlib import Path
+import asyncio
+import os
+import time
+import uuid
+import logging
+
+from external_apis import resolve_movie_metadata, get_streaming_sources, normalize_movie_data
+from database import db_service
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env', override=True)
+
+logger = logging.getLogger(__name__)
+
+# Warmer settings; a lease runs each cycle on a single worker, so budgets cover the deployment
+WARMER_ENABLED = os.getenv("WARMER_ENABLED", "true").lower() == "true"
+WARMER_INTERVAL_SECONDS = int(os.getenv("WARMER_INTERVAL_SECONDS", "300"))
+WARMER_TOP_N = int(os.getenv("WARMER_TOP_N", "100"))
+WARMER_ACTIVITY_HOURS = int(os.getenv("WARMER_ACTIVITY_HOURS", "24"))
+WARMER_MOVIE_LEAD_MINUTES = int(os.getenv("WARMER_MOVIE_LEAD_MINUTES", "60"))
+WARMER_STREAM_LEAD_MINUTES = int(os.getenv("WARMER_STREAM_LEAD_MINUTES", "10"))
+WARMER_TMDB_REQUESTS_PER_MINUTE = int(os.getenv("WARMER_TMDB_REQUESTS_PER_MINUTE", "30"))
+WARMER_CONSUMET_REQUESTS_PER_MINUTE = int(os.getenv("WARMER_CONSUMET_REQUESTS_PER_MINUTE", "10"))
+WARMER_WRITE_BATCH = 20
+WARMER_LEASE_ID = "cache_warmer"
+
+class RequestBudget:
+    """Token bucket limiting background requests to an upstream per minute."""
+    
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60
+        # Allow at most ten seconds' worth of requests in a burst
+        self.capacity = max(1.0, per_minute / 6)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.used = 0
+    
+    async def acquire(self):
+        """Wait for a request token."""
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.used += 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+# Shared by the warmer and the feed builder, so background TMDB traffic has one budget
+background_tmdb_budget = RequestBudget(WARMER_TMDB_REQUESTS_PER_MINUTE)
+
+class CacheWarmer:
+    """Refreshes hot movies and streams before they expire, within per-minute upstream budgets.
+    
+    Hot titles are the WARMER_TOP_N most popular cached movies plus the most
+    watched titles of the last WARMER_ACTIVITY_HOURS. Popular and trending list
+    pages are already kept warm by the feed builder. Workers share one cycle
+    per WARMER_INTERVAL_SECONDS through a lease in the leases collection, so
+    the budgets hold for the whole deployment rather than per worker.
+    """
+    
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self.lease_expires_at: Optional[datetime] = None
+        self.skipped_cycles = 0
+        self.lost_leases = 0
+        self.tmdb_budget = background_tmdb_budget
+        self.consumet_budget = RequestBudget(WARMER_CONSUMET_REQUESTS_PER_MINUTE)
+        self.task: Optional[asyncio.Task] = None
+        self.last_run_at: Optional[datetime] = None
+        self.cycles = 0
+        self.movies_warmed = 0
+        self.streams_warmed = 0
+        self.failures = 0
+    
+    async def _recently_watched(self) -> List[Dict[str, Any]]:
+        """Get the most watched titles of the activity window, most watched first."""
+        since = datetime.utcnow() - timedelta(hours=WARMER_ACTIVITY_HOURS)
+        cursor = db_service.db.watch_history.aggregate([
+            {"$match": {"watched_at": {"$gt": since}}},
+            {"$group": {"_id": "$tmdb_id", "views": {"$sum": 1}, "title": {"$first": "$title"}}},
+            {"$sort": {"views": -1}},
+            {"$limit": WARMER_TOP_N}
+        ])
+        return [{"tmdb_id": doc["_id"], "title": doc.get("title")} async for doc in cursor]
+    
+    async def _select(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Pick the movies and streams to refresh this cycle."""
+        now = datetime.utcnow()
+        movie_cutoff = now + timedelta(minutes=WARMER_MOVIE_LEAD_MINUTES)
+        stream_cutoff = now + timedelta(minutes=WARMER_STREAM_LEAD_MINUTES)
+        projection = {"_id": 0, "tmdb_id": 1, "title": 1, "release_date": 1, "first_air_date": 1, "expires_at": 1}
+        
+        watched = await self._recently_watched()
+        popular = await db_service.db.movies.find({}, projection).sort([("popularity", -1), ("_id", -1)]).limit(WARMER_TOP_N).to_list(WARMER_TOP_N)
+        # Expiry waves: everything about to expire, most popular first
+        expiring = await db_service.db.movies.find(
+            {"expires_at": {"$gt": now, "$lte": movie_cutoff}}, projection
+        ).sort("popularity", -1).limit(WARMER_TOP_N).to_list(WARMER_TOP_N)
+        
+        hot_ids = list(dict.fromkeys([item["tmdb_id"] for item in watched] + [movie["tmdb_id"] for movie in popular]))
+        movie_docs = {
+            movie_doc["tmdb_id"]: movie_doc
+            async for movie_doc in db_service.db.movies.find({"tmdb_id": {"$in": hot_ids}}, projection)
+        }
+        stream_expiry = {
+            stream_doc["tmdb_id"]: stream_doc["expires_at"]
+            async for stream_doc in db_service.db.streams.find({"tmdb_id": {"$in": hot_ids}}, {"_id": 0, "tmdb_id": 1, "expires_at": 1})
+        }
+        
+        movies = {}
+        for item in watched + popular + expiring:
+            movie_doc = movie_docs.get(item["tmdb_id"], item)
+            if "expires_at" not in movie_doc or movie_doc["expires_at"] <= movie_cutoff:
+                movies.setdefault(item["tmdb_id"], movie_doc)
+        
+        # Streams of recently watched titles are fetched even if never cached; popular ones only if cached
+        watched_ids = {item["tmdb_id"] for item in watched}
+        streams = []
+        for tmdb_id in hot_ids:
+            expires_at = stream_expiry.get(tmdb_id)
+            if (expires_at is None and tmdb_id in watched_ids) or (expires_at is not None and expires_at <= stream_cutoff):
+                movie = movie_docs.get(tmdb_id) or next((item for item in watched if item["tmdb_id"] == tmdb_id), None)
+                # A popular title whose doc expired between the queries has nothing to warm from
+                if movie:
+                    streams.append(movie)
+        
+        return {"movies": list(movies.values()), "streams": streams}
+    
+    async def _warm_movies(self, movies: List[Dict[str, Any]]):
+        """Re-fetch movie metadata from TMDB and write it back in small bulk upserts."""
+        pending = []
+        for movie in movies:
+            if not await self._extend_lease():
+                break
+            try:
+                # Bypass the response cache, which expires along with the doc being refreshed;
+                # an unknown media type can take two TMDB calls, each of which takes a token
+                movie_data = await resolve_movie_metadata(movie["tmdb_id"], refresh=True, before_fetch=self.tmdb_budget.acquire)
+            except Exception as e:
+                logger.warning(f"Warmer metadata fetch failed for {movie['tmdb_id']}: {str(e)}")
+                movie_data = None
+            if not movie_data:
+                self.failures += 1
+                continue
+            
+            pending.append(normalize_movie_data(movie_data))
+            if len(pending) >= WARMER_WRITE_BATCH:
+                await db_service.cache_movies_bulk(pending)
+                self.movies_warmed += len(pending)
+                pending = []
+        
+        if pending:
+            await db_service.cache_movies_bulk(pending)
+            self.movies_warmed += len(pending)
+    
+    async def _warm_streams(self, movies: List[Dict[str, Any]]):
+        """Re-fetch streaming sources for titles whose streams are about to expire."""
+        for movie in movies:
+            if not movie.get("title"):
+                continue
+            release_date = movie.get("release_date") or movie.get("first_air_date")
+            await self.consumet_budget.acquire()
+            if not await self._extend_lease():
+                break
+            try:
+                sources = await get_streaming_sources(movie["tmdb_id"], movie["title"], release_date[:4] if release_date else None)
+                await db_service.cache_streams(movie["tmdb_id"], sources, 1)  # Same 1 hour TTL as the stream endpoint
+                self.streams_warmed += 1
+            except Exception as e:
+                logger.warning(f"Warmer stream fetch failed for {movie['tmdb_id']}: {str(e)}")
+                self.failures += 1
+    
+    async def _claim_cycle(self) -> bool:
+        """Take the warmer lease for one interval; False if another worker holds it."""
+        now = datetime.utcnow()
+        if not await db_service.claim_lease(WARMER_LEASE_ID, self.worker_id, WARMER_INTERVAL_SECONDS):
+            return False
+        self.lease_expires_at = now + timedelta(seconds=WARMER_INTERVAL_SECONDS)
+        return True
+    
+    async def _extend_lease(self) -> bool:
+        """Keep the lease while a long cycle is still running; False once another worker has taken it."""
+        if self.lease_expires_at is None:
+            return False
+        now = datetime.utcnow()
+        if self.lease_expires_at - now > timedelta(seconds=WARMER_INTERVAL_SECONDS / 2):
+            return True
+        if not await db_service.extend_lease(WARMER_LEASE_ID, self.worker_id, WARMER_INTERVAL_SECONDS):
+            # The lease ran out and another worker's cycle has started; leave the rest to it
+            logger.warning("Cache warmer lost its lease; stopping this cycle")
+            self.lease_expires_at = None
+            self.lost_leases += 1
+            return False
+        self.lease_expires_at = now + timedelta(seconds=WARMER_INTERVAL_SECONDS)
+        return True
+    
+    async def run_once(self):
+        """Run one warming cycle unless another worker already has this one."""
+        if not await self._claim_cycle():
+            self.skipped_cycles += 1
+            return
+        
+        started = datetime.utcnow()
+        selected = await self._select()
+        # A zero budget turns that half of the warmer off
+        if self.tmdb_budget.rate:
+            await self._warm_movies(selected["movies"])
+        if self.consumet_budget.rate and self.lease_expires_at:
+            await self._warm_streams(selected["streams"])
+        
+        self.cycles += 1
+        self.last_run_at = started
+        logger.info(
+            f"Cache warmer refreshed {len(selected['movies'])} movies and {len(selected['streams'])} streams "
+            f"in {(datetime.utcnow() - started).total_seconds():.1f}s"
+        )
+    
+    async def _warm_loop(self):
+        """Warm caches every WARMER_INTERVAL_SECONDS, starting right after startup."""
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Cache warmer cycle failed: {str(e)}")
+            await asyncio.sleep(WARMER_INTERVAL_SECONDS)
+    
+    def start(self):
+        """Start the background cache warmer."""
+        if WARMER_ENABLED and not self.task:
+            self.task = asyncio.create_task(self._warm_loop())
+    
+    async def stop(self):
+        """Stop the background cache warmer."""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get warmer statistics."""
+        return {
+            "enabled": WARMER_ENABLED,
+            "cycles": self.cycles,
+            "skipped_cycles": self.skipped_cycles,
+            "lost_leases": self.lost_leases,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "movies_warmed": self.movies_warmed,
+            "streams_warmed": self.streams_warmed,
+            "failures": self.failures,
+            "tmdb_requests": self.tmdb_budget.used,
+            "consumet_requests": self.consumet_budget.used
+        }
+
+cache_warmer = CacheWarmer()
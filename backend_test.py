@@ -4,12 +4,20 @@ OnStream Backend API Test Suite
 Tests all backend endpoints for the OnStream movie streaming application.
 """
 
+import argparse
 import asyncio
 import aiohttp
 import json
+import math
 import os
+import random
+import shlex
+import subprocess
+import sys
+import time
 from datetime import datetime
-from typing import Dict, Any, Optional
+from pathlib import Path
+from typing import Dict, Any, List, Optional
 
 # Get backend URL from frontend .env
 BACKEND_URL = "http://localhost:8001"  # Use local backend for testing
@@ -468,8 +476,290 @@ class OnStreamAPITester:
         
         print("\n" + "=" * 60)
 
+# Benchmark defaults
+DEFAULT_MIX = "browse=40,search=20,detail=20,stream=10,favorites=10"
+SEARCH_TERMS = ["night", "city", "dark star", "war", "love", "shadow king", "storm", "batman", "house", "river"]
+FAKE_UPSTREAM_PORT = 8765
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(latencies: List[float], errors: int, duration: float) -> Dict[str, Any]:
+    """Summarize request latencies in milliseconds."""
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / duration, 2) if duration else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0
+    }
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parse 'scenario=weight,...' into a weight map."""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - set(OnStreamBenchmark.SCENARIOS)
+    if unknown:
+        raise ValueError(f"Unknown scenarios in mix: {', '.join(sorted(unknown))}")
+    return weights
+
+def git_commit() -> Optional[str]:
+    """Get the current commit so results can be compared between commits."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent
+        ).stdout.strip()
+    except Exception:
+        return None
+
+class OnStreamBenchmark:
+    """Closed-loop load generator: each worker sends its next request as soon as the last one returns."""
+    
+    SCENARIOS = ("browse", "search", "detail", "stream", "favorites")
+    
+    def __init__(self, concurrency: int, duration: float, mix: Dict[str, float], warmup: float = 0):
+        self.concurrency = concurrency
+        self.duration = duration
+        self.warmup = warmup
+        self.mix = mix
+        self.session = None
+        self.auth_token = None
+        self.movie_ids: List[int] = []
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.recording = False
+    
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency * 2)
+        self.session = aiohttp.ClientSession(connector=connector)
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.session:
+            await self.session.close()
+    
+    async def request(self, endpoint: str, method: str, path: str, **kwargs) -> Optional[Dict[str, Any]]:
+        """Send one request and record its latency under an endpoint name."""
+        headers = {"Authorization": f"Bearer {self.auth_token}"} if self.auth_token else None
+        start = time.perf_counter()
+        data = None
+        try:
+            async with self.session.request(method, f"{API_BASE}{path}", headers=headers, **kwargs) as response:
+                data = await response.json()
+                ok = response.status == 200 and data.get("success", False)
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        
+        if self.recording:
+            self.latencies.setdefault(endpoint, []).append(elapsed)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return data if ok else None
+    
+    async def setup(self):
+        """Register a benchmark user and collect movie ids to request details for."""
+        suffix = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        user = {"username": f"bench_{suffix}", "email": f"bench_{suffix}@example.com", "password": "BenchPass123!"}
+        await self.request("register", "POST", "/auth/register", json=user)
+        login = await self.request("login", "POST", "/auth/login", json={"username": user["username"], "password": user["password"]})
+        if login:
+            self.auth_token = login["data"]["access_token"]
+        
+        for page in range(1, 4):
+            data = await self.request("browse", "GET", "/movies", params={"page": page})
+            if data:
+                self.movie_ids += [movie["tmdb_id"] for movie in data["data"]["results"] if movie.get("tmdb_id")]
+        if not self.movie_ids:
+            self.movie_ids = [550]  # Fight Club
+    
+    async def browse(self):
+        params = {"page": random.randint(1, 5)}
+        if random.random() < 0.3:
+            params["type"] = random.choice(["movie", "tv"])
+        await self.request("GET /movies", "GET", "/movies", params=params)
+    
+    async def search(self):
+        await self.request("GET /search", "GET", "/search", params={"q": random.choice(SEARCH_TERMS)})
+    
+    async def detail(self):
+        await self.request("GET /movies/{id}", "GET", f"/movies/{random.choice(self.movie_ids)}")
+    
+    async def stream(self):
+        await self.request("GET /movies/{id}/stream", "GET", f"/movies/{random.choice(self.movie_ids)}/stream")
+    
+    async def favorites(self):
+        if not self.auth_token:
+            return
+        if random.random() < 0.5:
+            movie_id = random.choice(self.movie_ids)
+            await self.request("POST /favorites", "POST", "/favorites", json={
+                "tmdb_id": movie_id, "title": f"Movie {movie_id}", "type": "movie"
+            })
+        else:
+            await self.request("GET /favorites", "GET", "/favorites")
+    
+    async def worker(self, deadline: float):
+        """Run weighted scenarios until the deadline."""
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        while time.perf_counter() < deadline:
+            await getattr(self, random.choices(names, weights)[0])()
+    
+    async def run_phase(self, seconds: float):
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(self.worker(deadline) for _ in range(self.concurrency)))
+    
+    async def run(self) -> Dict[str, Any]:
+        """Warm up, run the measured phase and return the results."""
+        await self.setup()
+        if self.warmup:
+            print(f"🔥 Warming up for {self.warmup:.0f}s")
+            await self.run_phase(self.warmup)
+        
+        print(f"🏁 Running {self.concurrency} workers for {self.duration:.0f}s")
+        self.recording = True
+        started = time.perf_counter()
+        await self.run_phase(self.duration)
+        elapsed = time.perf_counter() - started
+        self.recording = False
+        
+        all_latencies = [latency for latencies in self.latencies.values() for latency in latencies]
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "commit": git_commit(),
+            "backend_url": BACKEND_URL,
+            "config": {"concurrency": self.concurrency, "duration": self.duration, "warmup": self.warmup, "mix": self.mix},
+            "total": summarize(all_latencies, sum(self.errors.values()), elapsed),
+            "endpoints": {
+                endpoint: summarize(latencies, self.errors.get(endpoint, 0), elapsed)
+                for endpoint, latencies in sorted(self.latencies.items())
+            }
+        }
+
+def print_benchmark(results: Dict[str, Any]):
+    """Print a benchmark report."""
+    print("\n" + "=" * 96)
+    print("📊 BENCHMARK RESULTS")
+    print("=" * 96)
+    print(f"{'endpoint':<26}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'max ms':>11}")
+    rows = list(results["endpoints"].items()) + [("TOTAL", results["total"])]
+    for endpoint, stats in rows:
+        print(f"{endpoint:<26}{stats['requests']:>10}{stats['errors']:>8}{stats['throughput_rps']:>10.1f}"
+              f"{stats['p50_ms']:>11.2f}{stats['p95_ms']:>11.2f}{stats['p99_ms']:>11.2f}{stats['max_ms']:>11.2f}")
+    print("=" * 96)
+
+async def wait_for_backend(timeout: float = 60):
+    """Poll /health until the backend answers."""
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{BACKEND_URL}/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"Backend at {BACKEND_URL} did not become healthy")
+
+def start_offline_stack(port: int, workers: int, db_name: str, upstream_args: str = "") -> List[subprocess.Popen]:
+    """Start the fake upstream and a backend pointed at it, using db_name on the MONGO_URL mongod from backend/.env."""
+    root = Path(__file__).parent
+    upstream = subprocess.Popen(
+        [sys.executable, str(root / "scripts" / "fake_upstream.py"), "--port", str(FAKE_UPSTREAM_PORT)] + shlex.split(upstream_args)
+    )
+    env = {
+        **os.environ,
+        "TMDB_BASE_URL": f"http://127.0.0.1:{FAKE_UPSTREAM_PORT}/3",
+        "CONSUMET_API_BASE": f"http://127.0.0.1:{FAKE_UPSTREAM_PORT}",
+        "RATE_LIMIT_ENABLED": "false",
+        # Keep benchmark users, favorites and history out of the dev database
+        "DB_NAME_OVERRIDE": db_name
+    }
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=root / "backend", env=env
+    )
+    return [backend, upstream]
+
+def drop_database(db_name: str):
+    """Drop a throwaway benchmark database from the MONGO_URL mongod in backend/.env."""
+    from dotenv import dotenv_values
+    from pymongo import MongoClient
+    
+    mongo_url = dotenv_values(Path(__file__).parent / "backend" / ".env").get("MONGO_URL") or "mongodb://localhost:27017"
+    client = MongoClient(mongo_url, serverSelectionTimeoutMS=5000)
+    try:
+        client.drop_database(db_name)
+    except Exception as e:
+        print(f"⚠️ Could not drop benchmark database {db_name}: {e}")
+    finally:
+        client.close()
+
+async def run_benchmark(args):
+    """Run the benchmark and write machine-readable results."""
+    processes = []
+    db_name = None
+    if args.start_backend:
+        db_name = f"onstream_bench_{int(time.time())}"
+        processes = start_offline_stack(args.port, args.workers, db_name, args.upstream_args)
+    
+    try:
+        await wait_for_backend()
+        async with OnStreamBenchmark(args.concurrency, args.duration, parse_mix(args.mix), args.warmup) as benchmark:
+            results = await benchmark.run()
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        if db_name:
+            drop_database(db_name)
+    
+    print_benchmark(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
 async def main():
     """Main test runner."""
+    global BACKEND_URL, API_BASE
+    
+    parser = argparse.ArgumentParser(description="OnStream backend API tests and benchmarks")
+    parser.add_argument("--backend-url", default=BACKEND_URL)
+    parser.add_argument("--benchmark", action="store_true", help="Run the load benchmark instead of the functional tests")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent benchmark workers")
+    parser.add_argument("--duration", type=float, default=30, help="Measured benchmark seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured warm-up seconds")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Scenario weights: browse, search, detail, stream, favorites")
+    parser.add_argument("--output", help="Write benchmark results as JSON")
+    parser.add_argument("--start-backend", action="store_true",
+                        help="Start the fake TMDB/Consumet upstream and a backend pointed at it, on a throwaway database (needs a local mongod)")
+    parser.add_argument("--port", type=int, default=8001, help="Port for --start-backend")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for --start-backend")
+    parser.add_argument("--upstream-args", default="",
+                        help="Extra scripts/fake_upstream.py options for --start-backend, e.g. '--tmdb-latency lognormal:0.08,0.5'")
+    args = parser.parse_args()
+    
+    BACKEND_URL = f"http://localhost:{args.port}" if args.start_backend else args.backend_url.rstrip("/")
+    API_BASE = f"{BACKEND_URL}/api"
+    
+    if args.benchmark:
+        await run_benchmark(args)
+        return
+    
     async with OnStreamAPITester() as tester:
         await tester.run_all_tests()
 
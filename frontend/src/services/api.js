@@ -88,6 +88,11 @@ export const moviesAPI = {
     return response;
   },
 
+  getMoviesBatch: async (movieIds) => {
+    const response = await apiClient.post('/movies/batch', { tmdb_ids: movieIds });
+    return response;
+  },
+
   getStreamingSources: async (movieId) => {
     const response = await apiClient.get(`/movies/${movieId}/stream`);
     return response;
@@ -100,6 +105,13 @@ export const moviesAPI = {
     return response;
   },
 
+  suggestTitles: async (query, limit = 8) => {
+    const response = await apiClient.get('/search/suggest', {
+      params: { q: query, limit }
+    });
+    return response;
+  },
+
   getTrending: async () => {
     const response = await apiClient.get('/trending');
     return response;
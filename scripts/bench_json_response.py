@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for API response serialization.
+
+Compares returning APIResponse through FastAPI's response_model path
+(validate, jsonable encode, stdlib json) against responses.api_response,
+which renders the same body straight to bytes with orjson. Checks that
+both produce the same JSON before timing them.
+
+Usage: python scripts/bench_json_response.py [--iterations 2000] [--page-size 20]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from models import APIResponse, MovieMetadata
+from responses import api_response
+
+def movie_doc(tmdb_id: int) -> dict:
+    """Build a cached movie document as stored in Mongo."""
+    now = datetime.utcnow()
+    return {
+        "_id": ObjectId(),
+        "tmdb_id": tmdb_id,
+        "title": f"Benchmark Movie {tmdb_id}",
+        "overview": "Synthetic overview " * 10,
+        "poster_path": f"/poster{tmdb_id}.jpg",
+        "backdrop_path": f"/backdrop{tmdb_id}.jpg",
+        "release_date": "2024-01-01",
+        "first_air_date": None,
+        "genres": [{"id": 28, "name": "Action"}, {"id": 18, "name": "Drama"}],
+        "vote_average": 7.5,
+        "vote_count": 1200,
+        "type": "movie",
+        "popularity": float(tmdb_id),
+        "cached_at": now,
+        "expires_at": now + timedelta(hours=24)
+    }
+
+def page(page_size: int) -> dict:
+    """Build a get_movies_paginated result."""
+    results = []
+    for i in range(page_size):
+        doc = movie_doc(i)
+        doc["_id"] = str(doc["_id"])
+        results.append(MovieMetadata(**doc))
+    return {"page": 1, "total_pages": 10, "total_results": 200, "results": results, "next_cursor": "abc"}
+
+async def legacy_body(field, data) -> bytes:
+    """What FastAPI does with a returned APIResponse and response_model=APIResponse."""
+    content = await serialize_response(field=field, response_content=APIResponse(success=True, message="ok", data=data))
+    return JSONResponse(content).body
+
+async def fast_body(field, data) -> bytes:
+    return api_response(data, "ok").body
+
+async def run(name: str, fn, field, data, iterations: int):
+    start = time.process_time()
+    for _ in range(iterations):
+        await fn(field, data)
+    per_request = (time.process_time() - start) / iterations * 1e6
+    print(f"{name:<22} {per_request:9.1f} us CPU/response")
+    return per_request
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=20)
+    args = parser.parse_args()
+
+    field = create_response_field("Response_bench", APIResponse)
+    detail_doc = movie_doc(550)
+    detail_doc["_id"] = str(detail_doc["_id"])
+    cases = {
+        f"movie page ({args.page_size} items)": page(args.page_size),
+        "movie details": MovieMetadata(**detail_doc).model_dump()
+    }
+
+    for case, data in cases.items():
+        legacy, fast = await legacy_body(field, data), await fast_body(field, data)
+        if json.loads(legacy) != json.loads(fast):
+            raise SystemExit(f"{case}: fast response body differs from the response_model body")
+
+        print(f"{case}: {len(fast)} bytes")
+        before = await run("response_model", legacy_body, field, data, args.iterations)
+        after = await run("api_response", fast_body, field, data, args.iterations)
+        print(f"{'speedup':<22} {before / after:9.1f}x\n")
+
+if __name__ == "__main__":
+    asyncio.run(main())
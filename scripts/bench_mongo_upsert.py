@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the movie cache upsert path.
+
+Compares the old update_one + find_one pattern against the single
+find_one_and_update used by DatabaseService.cache_movie. Needs a local mongod.
+
+Usage: python scripts/bench_mongo_upsert.py [--iterations 2000] [--mongo-url mongodb://localhost:27017]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from database import DatabaseService
+
+def movie_data(tmdb_id: int) -> dict:
+    """Build a synthetic TMDB movie payload."""
+    return {
+        "id": tmdb_id,
+        "title": f"Benchmark Movie {tmdb_id}",
+        "overview": "Synthetic overview " * 10,
+        "release_date": "2024-01-01",
+        "vote_average": 7.5,
+        "popularity": float(tmdb_id)
+    }
+
+async def legacy_cache_movie(service: DatabaseService, data: dict):
+    """The pre-change two round trip upsert."""
+    movie_doc = service._build_movie_doc(data, datetime.utcnow() + timedelta(hours=24))
+    result = await service.db.movies.update_one({"tmdb_id": data["id"]}, {"$set": movie_doc}, upsert=True)
+    if not result.upserted_id:
+        await service.db.movies.find_one({"tmdb_id": data["id"]})
+
+async def run(name: str, fn, service: DatabaseService, iterations: int, keyspace: int):
+    """Time fn over the keyspace; most calls hit existing docs, like the hot path."""
+    timings = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        await fn(service, movie_data(i % keyspace))
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    print(f"{name:<22} mean={statistics.mean(timings):.3f}ms "
+          f"p50={timings[len(timings) // 2]:.3f}ms p99={timings[int(len(timings) * 0.99)]:.3f}ms")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--keyspace", type=int, default=200)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    args = parser.parse_args()
+
+    service = DatabaseService()
+    service.client = AsyncIOMotorClient(args.mongo_url)
+    service.db = service.client["onstream_bench"]
+    await service.db.movies.drop()
+    await service.db.movies.create_index("tmdb_id", unique=True)
+
+    try:
+        await run("update_one+find_one", legacy_cache_movie, service, args.iterations, args.keyspace)
+        await run("find_one_and_update", lambda s, d: s.cache_movie(d), service, args.iterations, args.keyspace)
+    finally:
+        await service.client.drop_database("onstream_bench")
+        service.client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
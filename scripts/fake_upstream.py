@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the TMDB and Consumet APIs.
+
+Serves deterministic synthetic responses for every endpoint used by
+TMDBService and ConsumetService, so benchmarks run offline. Point the
+backend at it with:
+
+    TMDB_BASE_URL=http://127.0.0.1:8765/3 CONSUMET_API_BASE=http://127.0.0.1:8765
+
+Latency, failures and payload size are configurable per service:
+
+    --tmdb-latency lognormal:0.08,0.5     median 80ms, sigma 0.5
+    --consumet-latency uniform:0.2,1.5    other forms: const:S, normal:MEAN,SD, exp:MEAN
+    --tmdb-error-rate 0.02                fraction answered with --error-status
+    --consumet-timeout-rate 0.05          fraction that hang for --hang-seconds
+    --page-size 20 --overview-bytes 2000  list length and per-item text size
+
+--fixtures DIR serves recorded responses instead of synthetic ones when
+DIR/<path>.json exists, e.g. DIR/3/movie/550.json for TMDB movie 550.
+GET /_stats returns request counts per route, POST /_stats/reset clears
+them. The same --seed gives the same latency and failure sequence.
+
+Usage: python scripts/fake_upstream.py [--host 127.0.0.1] [--port 8765] [options]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+from pathlib import Path
+from typing import Callable, Optional
+from aiohttp import web
+
+# Movie ids are below TV_ID_OFFSET, TV ids above it, so type probes get a 404 like TMDB
+TV_ID_OFFSET = 100000
+CATALOG_SIZE = 5000
+
+GENRES = [
+    {"id": 28, "name": "Action"}, {"id": 12, "name": "Adventure"}, {"id": 16, "name": "Animation"},
+    {"id": 35, "name": "Comedy"}, {"id": 80, "name": "Crime"}, {"id": 18, "name": "Drama"},
+    {"id": 14, "name": "Fantasy"}, {"id": 27, "name": "Horror"}, {"id": 9648, "name": "Mystery"},
+    {"id": 10749, "name": "Romance"}, {"id": 878, "name": "Science Fiction"}, {"id": 53, "name": "Thriller"}
+]
+WORDS = ["night", "city", "last", "dark", "river", "star", "war", "love", "shadow", "king", "storm", "house"]
+
+def latency_distribution(spec: str) -> Callable[[random.Random], float]:
+    """Parse a latency spec like 'lognormal:0.08,0.5' into a sampler returning seconds."""
+    kind, _, raw = spec.partition(":")
+    try:
+        args = [float(value) for value in raw.split(",") if value]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid latency distribution: {spec}")
+    if len(args) != (2 if kind in ("uniform", "normal", "lognormal") else 1):
+        raise argparse.ArgumentTypeError(f"Invalid latency distribution: {spec}")
+    
+    if kind == "const":
+        return lambda rng: args[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(args[0], args[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(args[0]), args[1])
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1 / args[0])
+    raise argparse.ArgumentTypeError(f"Invalid latency distribution: {spec}")
+
+def media_item(item_id: int, overview_bytes: int = 0) -> dict:
+    """Build a list entry for a movie or TV id; the same id always gives the same item."""
+    rng = random.Random(item_id)
+    title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))).title()
+    date = f"{rng.randint(1990, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    overview = f"A synthetic story about {title.lower()}."
+    if len(overview) < overview_bytes:
+        overview = (overview + " ") * (overview_bytes // (len(overview) + 1)) + overview[:overview_bytes % (len(overview) + 1)]
+    item = {
+        "id": item_id,
+        "overview": overview,
+        "poster_path": f"/poster{item_id}.jpg",
+        "backdrop_path": f"/backdrop{item_id}.jpg",
+        "vote_average": round(rng.uniform(4, 9), 1),
+        "vote_count": rng.randint(10, 20000),
+        "popularity": round(rng.uniform(1, 1000), 3),
+        "genre_ids": [genre["id"] for genre in rng.sample(GENRES, 2)]
+    }
+    if item_id >= TV_ID_OFFSET:
+        item.update({"name": title, "first_air_date": date, "media_type": "tv"})
+    else:
+        item.update({"title": title, "release_date": date, "media_type": "movie"})
+    return item
+
+def details(item_id: int, overview_bytes: int = 0) -> dict:
+    """Build a details response."""
+    item = media_item(item_id, overview_bytes)
+    genre_ids = item.pop("genre_ids")
+    item["genres"] = [genre for genre in GENRES if genre["id"] in genre_ids]
+    if item_id >= TV_ID_OFFSET:
+        item["episode_run_time"] = [45]
+    else:
+        item["runtime"] = 90 + item_id % 60
+    return item
+
+def page_of(request: web.Request, ids: list) -> dict:
+    """Build a paginated TMDB list response."""
+    config = request.app["config"]
+    page = max(1, int(request.query.get("page", "1")))
+    start = (page - 1) * config.page_size
+    return {
+        "page": page,
+        "total_pages": max(1, -(-len(ids) // config.page_size)),
+        "total_results": len(ids),
+        "results": [media_item(item_id, config.overview_bytes) for item_id in ids[start:start + config.page_size]]
+    }
+
+async def popular(request: web.Request) -> web.Response:
+    offset = TV_ID_OFFSET if request.match_info["media_type"] == "tv" else 0
+    return web.json_response(page_of(request, [offset + i for i in range(1, CATALOG_SIZE + 1)]))
+
+async def trending(request: web.Request) -> web.Response:
+    ids = [i for pair in zip(range(1, 11), range(TV_ID_OFFSET + 1, TV_ID_OFFSET + 11)) for i in pair]
+    return web.json_response(page_of(request, ids))
+
+async def search_multi(request: web.Request) -> web.Response:
+    # Derive a stable result set from the query
+    rng = random.Random(request.query.get("query", "").lower())
+    ids = rng.sample(range(1, CATALOG_SIZE), 30) + rng.sample(range(TV_ID_OFFSET + 1, TV_ID_OFFSET + CATALOG_SIZE), 10)
+    return web.json_response(page_of(request, ids))
+
+async def movie_details(request: web.Request) -> web.Response:
+    item_id = int(request.match_info["item_id"])
+    is_tv = request.match_info["media_type"] == "tv"
+    if (item_id >= TV_ID_OFFSET) != is_tv:
+        return web.json_response({"success": False, "status_code": 34}, status=404)
+    return web.json_response(details(item_id, request.app["config"].overview_bytes))
+
+async def genre_list(request: web.Request) -> web.Response:
+    return web.json_response({"genres": GENRES})
+
+async def consumet_search(request: web.Request) -> web.Response:
+    query = request.query.get("query", "")
+    rng = random.Random(query.lower())
+    return web.json_response({
+        "currentPage": 1,
+        "hasNextPage": False,
+        "results": [
+            {"id": f"movie/watch-{query.lower().replace(' ', '-')}-{rng.randint(1000, 99999)}", "title": query, "type": "Movie"}
+            for _ in range(3)
+        ]
+    })
+
+async def consumet_info(request: web.Request) -> web.Response:
+    media_id = request.match_info["media_id"]
+    return web.json_response({"id": media_id, "title": media_id, "episodes": [{"id": "1", "title": media_id}]})
+
+async def consumet_watch(request: web.Request) -> web.Response:
+    return web.json_response({
+        "sources": [{"url": "http://127.0.0.1/stream.m3u8", "quality": "auto", "isM3U8": True}],
+        "subtitles": []
+    })
+
+class FaultInjector:
+    """Per-service latency, error and timeout injection, with request counts for /_stats."""
+    
+    def __init__(self, config: argparse.Namespace):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.latency = {"tmdb": config.tmdb_latency, "consumet": config.consumet_latency}
+        self.counts = {}
+    
+    def service(self, path: str) -> str:
+        return "tmdb" if path.startswith("/3/") else "consumet"
+    
+    def fixture(self, path: str) -> Optional[Path]:
+        """Get a recorded response for a path, if there is one."""
+        if not self.config.fixtures:
+            return None
+        fixture = (Path(self.config.fixtures) / f"{path.strip('/')}.json").resolve()
+        root = Path(self.config.fixtures).resolve()
+        return fixture if root in fixture.parents and fixture.is_file() else None
+    
+    @web.middleware
+    async def middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        if request.path.startswith("/_stats"):
+            return await handler(request)
+        
+        service = self.service(request.path)
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else "unmatched"
+        self.counts[route] = self.counts.get(route, 0) + 1
+        
+        await asyncio.sleep(self.latency[service](self.rng))
+        
+        roll = self.rng.random()
+        timeout_rate = getattr(self.config, f"{service}_timeout_rate")
+        error_rate = getattr(self.config, f"{service}_error_rate")
+        if roll < timeout_rate:
+            await asyncio.sleep(self.config.hang_seconds)
+        elif roll < timeout_rate + error_rate:
+            return web.json_response({"success": False, "status_message": "Injected failure"}, status=self.config.error_status)
+        
+        fixture = self.fixture(request.path)
+        if fixture:
+            return web.json_response(json.loads(fixture.read_text()))
+        return await handler(request)
+    
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"requests": sum(self.counts.values()), "routes": self.counts})
+    
+    async def reset_stats(self, request: web.Request) -> web.Response:
+        self.counts = {}
+        return web.json_response({"requests": 0, "routes": {}})
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tmdb-latency", type=latency_distribution, default="const:0")
+    parser.add_argument("--consumet-latency", type=latency_distribution, default="const:0")
+    parser.add_argument("--tmdb-error-rate", type=float, default=0.0)
+    parser.add_argument("--consumet-error-rate", type=float, default=0.0)
+    parser.add_argument("--tmdb-timeout-rate", type=float, default=0.0)
+    parser.add_argument("--consumet-timeout-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--hang-seconds", type=float, default=60.0)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--overview-bytes", type=int, default=0)
+    parser.add_argument("--fixtures", help="Directory of recorded responses, laid out by request path")
+    return parser
+
+def create_app(config: Optional[argparse.Namespace] = None) -> web.Application:
+    """Create the fake upstream application; config defaults to the command line defaults."""
+    config = config or build_parser().parse_args([])
+    faults = FaultInjector(config)
+    
+    app = web.Application(middlewares=[faults.middleware])
+    app["config"] = config
+    app.router.add_get("/_stats", faults.stats)
+    app.router.add_post("/_stats/reset", faults.reset_stats)
+    app.router.add_get("/3/{media_type:movie|tv}/popular", popular)
+    app.router.add_get("/3/trending/{media_type}/{time_window}", trending)
+    app.router.add_get("/3/search/multi", search_multi)
+    app.router.add_get("/3/{media_type:movie|tv}/{item_id:\\d+}", movie_details)
+    app.router.add_get("/3/genre/{media_type}/list", genre_list)
+    app.router.add_get("/movies/flixhq/info/{media_id:.+}", consumet_info)
+    app.router.add_get("/movies/flixhq/watch", consumet_watch)
+    app.router.add_get("/movies/{provider}", consumet_search)
+    return app
+
+def main():
+    config = build_parser().parse_args()
+    web.run_app(create_app(config), host=config.host, port=config.port, print=None)
+
+if __name__ == "__main__":
+    main()
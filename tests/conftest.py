@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+# The backend modules import each other as top-level modules, the way uvicorn runs them
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from database import db_service
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """An in-memory stand-in for db_service.db, with no write hooks attached."""
+    db = AsyncMongoMockClient()["onstream_test"]
+    monkeypatch.setattr(db_service, "db", db)
+    monkeypatch.setattr(db_service, "movie_write_hooks", [])
+    monkeypatch.setattr(db_service, "movie_delete_hooks", [])
+    return db
@@ -0,0 +1,72 @@
+import asyncio
+
+import external_apis
+from external_apis import ConsumetService, ALT_SOURCE_MAX_FAILURES
+
+def fake_provider_requests(service, monkeypatch, delays):
+    """Answer each provider's search with three results after its delay."""
+    queried = []
+    
+    async def make_request(endpoint, params=None, timeout=None, coalesce=True):
+        provider = endpoint.split("/")[-1]
+        queried.append(provider)
+        await asyncio.sleep(delays[provider])
+        return {"results": [{"id": f"{provider}-{i}"} for i in range(3)]}
+    
+    monkeypatch.setattr(service, "_make_request", make_request)
+    return queried
+
+async def search_repeatedly(service, times, min_results=3):
+    for _ in range(times):
+        await service.search_alternative_sources("Dark City", min_results=min_results)
+        # Let the cancelled stragglers run their handlers
+        await asyncio.sleep(0.01)
+
+def test_losing_the_race_to_min_results_keeps_a_provider_enabled(monkeypatch):
+    service = ConsumetService()
+    service.provider_health = {"flixhq": service.provider_health["flixhq"], "dramacool": service.provider_health["dramacool"]}
+    fake_provider_requests(service, monkeypatch, {"flixhq": 0, "dramacool": 0.5})
+    
+    asyncio.run(search_repeatedly(service, ALT_SOURCE_MAX_FAILURES + 2))
+    
+    slow = service.provider_health["dramacool"]
+    assert slow.is_available()
+    assert slow.consecutive_failures == 0
+
+def test_providers_cut_off_by_the_budget_count_as_timeouts(monkeypatch):
+    monkeypatch.setattr(external_apis, "ALT_SOURCE_BUDGET", 0.05)
+    service = ConsumetService()
+    service.provider_health = {"dramacool": service.provider_health["dramacool"]}
+    fake_provider_requests(service, monkeypatch, {"dramacool": 0.5})
+    
+    asyncio.run(search_repeatedly(service, ALT_SOURCE_MAX_FAILURES))
+    
+    slow = service.provider_health["dramacool"]
+    assert slow.consecutive_failures == ALT_SOURCE_MAX_FAILURES
+    assert not slow.is_available()
+
+def test_providers_much_slower_than_their_peers_sit_out(monkeypatch):
+    monkeypatch.setattr(external_apis, "ALT_SOURCE_SLOW_FLOOR", 0.05)
+    service = ConsumetService()
+    service.provider_health = {"flixhq": service.provider_health["flixhq"], "dramacool": service.provider_health["dramacool"]}
+    queried = fake_provider_requests(service, monkeypatch, {"flixhq": 0, "dramacool": 0.2})
+    
+    # Wait for every provider so both latencies are measured, then search again
+    asyncio.run(search_repeatedly(service, 2, min_results=100))
+    
+    assert sorted(queried[:2]) == ["dramacool", "flixhq"]
+    assert queried[2:] == ["flixhq"]
+    assert not service.provider_health["dramacool"].is_available()
+    assert service.provider_health["flixhq"].is_available()
+
+def test_providers_answering_near_their_deadline_sit_out(monkeypatch):
+    monkeypatch.setattr(external_apis, "ALT_SOURCE_SLOW_LATENCY", 0.1)
+    service = ConsumetService()
+    service.provider_health = {"dramacool": service.provider_health["dramacool"]}
+    fake_provider_requests(service, monkeypatch, {"dramacool": 0.2})
+    
+    asyncio.run(search_repeatedly(service, 1))
+    
+    slow = service.provider_health["dramacool"]
+    assert not slow.is_available()
+    assert slow.consecutive_failures == 0
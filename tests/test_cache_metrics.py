@@ -0,0 +1,37 @@
+import asyncio
+from types import SimpleNamespace
+
+from database import db_service
+from metrics import CacheStats, cache_stats
+
+class FailingCollection:
+    def __init__(self):
+        self.writes = []
+        self.fail = True
+    
+    async def bulk_write(self, operations, ordered=True):
+        if self.fail:
+            raise ConnectionError("mongo unavailable")
+        self.writes.extend(operations)
+
+def test_failed_flush_keeps_deltas_for_the_next_one(monkeypatch):
+    stats = CacheStats()
+    monkeypatch.setitem(cache_stats, "test", stats)
+    for tier in list(cache_stats):
+        if tier != "test":
+            monkeypatch.delitem(cache_stats, tier)
+    collection = FailingCollection()
+    monkeypatch.setattr(db_service, "db", SimpleNamespace(cache_metrics=collection))
+    
+    stats.incr("tmdb_details", "hits", 3)
+    stats.observe("tmdb_details", 0.002)
+    asyncio.run(db_service.flush_cache_metrics())
+    stats.incr("tmdb_details", "hits")
+    
+    collection.fail = False
+    asyncio.run(db_service.flush_cache_metrics())
+    
+    [operation] = collection.writes
+    increments = operation._doc["$inc"]
+    assert increments["counters.hits"] == 4
+    assert increments["latency.count"] == 1
@@ -0,0 +1,89 @@
+import asyncio
+
+import external_apis
+from external_apis import CircuitBreaker, tmdb_service
+
+
+def test_breaker_opens_after_consecutive_failures_and_lets_one_probe_through(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(external_apis.time, "monotonic", lambda: clock[0])
+    breaker = CircuitBreaker("upstream", 10)
+    
+    for _ in range(external_apis.BREAKER_FAILURE_THRESHOLD):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    
+    # After the reset timeout a single half-open probe goes through
+    clock[0] += external_apis.BREAKER_RESET_TIMEOUT
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    
+    breaker.record_success(0.2)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens_the_breaker(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(external_apis.time, "monotonic", lambda: clock[0])
+    breaker = CircuitBreaker("upstream", 10)
+    for _ in range(external_apis.BREAKER_FAILURE_THRESHOLD):
+        breaker.record_failure()
+    
+    clock[0] += external_apis.BREAKER_RESET_TIMEOUT
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_timeout_follows_latency_within_bounds():
+    breaker = CircuitBreaker("upstream", 10)
+    assert breaker.timeout() == 10
+    
+    for _ in range(20):
+        breaker.record_success(0.1)
+    assert breaker.timeout() == external_apis.BREAKER_MIN_TIMEOUT
+    
+    for _ in range(20):
+        breaker.record_success(30)
+    assert breaker.timeout() == 10
+
+
+class FakeResponse:
+    status = 200
+    
+    async def json(self):
+        return {"results": []}
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        return False
+
+
+def test_tmdb_requests_use_the_breaker_timeout_with_a_connect_timeout(monkeypatch):
+    timeouts = []
+    
+    class FakeSession:
+        def get(self, url, params=None, timeout=None):
+            timeouts.append(timeout)
+            return FakeResponse()
+    
+    async def get_session():
+        return FakeSession()
+    
+    async def cache_set(*args):
+        pass
+    
+    monkeypatch.setattr(external_apis.http_client, "get_session", get_session)
+    monkeypatch.setattr(external_apis.response_cache, "set", cache_set)
+    monkeypatch.setattr(external_apis, "tmdb_breaker", CircuitBreaker("tmdb", 15))
+    
+    asyncio.run(tmdb_service._fetch("tmdb_lists", "https://tmdb.test/movie/popular", {}, "key"))
+    
+    assert timeouts[0].total == 15
+    assert timeouts[0].connect == external_apis.HTTP_CONNECT_TIMEOUT
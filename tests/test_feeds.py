@@ -0,0 +1,63 @@
+import asyncio
+
+import feeds
+from feeds import FeedBuilder, TRENDING_FEED_KEY
+
+
+def fake_tmdb(monkeypatch):
+    """Count TMDB calls made while building feeds."""
+    calls = []
+    
+    async def listing(name, *args):
+        calls.append(name)
+        media_type = "tv" if name == "popular_tv" else "movie"
+        return {"results": [{
+            "id": 100 + len(calls), "title": f"Title {len(calls)}", "name": f"Title {len(calls)}",
+            "media_type": media_type, "release_date": "2024-01-01", "genre_ids": []
+        }]}
+    
+    async def genres(media_type):
+        calls.append(f"genres_{media_type}")
+        return {"genres": [{"id": 28, "name": "Action"}]}
+    
+    monkeypatch.setattr(feeds.tmdb_service, "get_popular_movies", lambda page: listing("popular_movies", page))
+    monkeypatch.setattr(feeds.tmdb_service, "get_popular_tv", lambda page: listing("popular_tv", page))
+    monkeypatch.setattr(feeds.tmdb_service, "get_trending", lambda *args: listing("trending", *args))
+    monkeypatch.setattr(feeds.tmdb_service, "get_genres", genres)
+    return calls
+
+
+def test_only_the_lease_holder_builds_and_others_load_its_feeds(mongo, monkeypatch):
+    calls = fake_tmdb(monkeypatch)
+    monkeypatch.setattr(feeds, "FEED_PAGES", 1)
+    builder, other = FeedBuilder(), FeedBuilder()
+    
+    async def scenario():
+        # The other worker holds the lease and hasn't saved anything yet
+        assert await feeds.db_service.claim_lease(feeds.FEED_LEASE_ID, other.worker_id, 60)
+        assert not await builder.refresh()
+        assert builder.builds == 0 and not calls
+        
+        await mongo.leases.delete_many({})
+        assert await builder.refresh()
+        built_calls = len(calls)
+        assert builder.builds == 1 and built_calls
+        
+        assert await other.refresh()
+        assert other.builds == 0 and len(calls) == built_calls
+        assert other.get_page(TRENDING_FEED_KEY) == builder.get_page(TRENDING_FEED_KEY)
+    
+    asyncio.run(scenario())
+
+
+def test_feed_builds_are_charged_to_the_shared_tmdb_budget(mongo, monkeypatch):
+    calls = fake_tmdb(monkeypatch)
+    monkeypatch.setattr(feeds, "FEED_PAGES", 2)
+    budget = feeds.background_tmdb_budget
+    monkeypatch.setattr(budget, "rate", 1000.0)
+    monkeypatch.setattr(budget, "tokens", 100.0)
+    used = budget.used
+    
+    asyncio.run(FeedBuilder().build())
+    
+    assert budget.used - used == len(calls)
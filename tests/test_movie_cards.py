@@ -0,0 +1,13 @@
+import orjson
+from fastapi.encoders import jsonable_encoder
+from models import MovieCard, card_json
+from responses import api_response
+
+def test_movie_cards_keep_the_list_endpoints_id_key():
+    card = MovieCard.from_doc({"_id": "abc", "tmdb_id": 1, "title": "Dark City"})
+    
+    served = orjson.loads(api_response({"results": [card]}).body)["data"]["results"][0]
+    materialized = jsonable_encoder({"results": [card]}, custom_encoder={MovieCard: card_json})["results"][0]
+    
+    assert served["_id"] == materialized["_id"] == "abc"
+    assert "id" not in served and "id" not in materialized
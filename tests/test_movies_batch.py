@@ -0,0 +1,37 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import server
+
+
+def tmdb_movie(tmdb_id, title):
+    return {"id": tmdb_id, "title": title, "media_type": "movie", "release_date": "2001-04-25", "genres": [], "popularity": 10.0}
+
+
+def test_batch_serves_cached_movies_fetches_misses_and_keeps_order(mongo, monkeypatch):
+    fetched = []
+    
+    async def resolve(movie_id, refresh=False, before_fetch=None):
+        fetched.append(movie_id)
+        return tmdb_movie(movie_id, "Amélie") if movie_id == 194 else {}
+    
+    monkeypatch.setattr(server, "resolve_movie_metadata", resolve)
+    asyncio.run(server.db_service.cache_movies_bulk([server.normalize_movie_data(tmdb_movie(949, "Heat"))]))
+    
+    response = TestClient(server.app).post("/api/movies/batch", json={"tmdb_ids": [194, 949, 404, 194]})
+    
+    data = response.json()["data"]
+    assert [movie["tmdb_id"] for movie in data["results"]] == [194, 949]
+    assert data["missing"] == [404]
+    assert sorted(fetched) == [194, 404]
+    written = asyncio.run(mongo.movies.find_one({"tmdb_id": 194}))
+    assert written and data["results"][0]["id"] == str(written["_id"])
+
+
+def test_batch_rejects_too_many_ids(mongo, monkeypatch):
+    monkeypatch.setattr(server, "MOVIE_BATCH_MAX_IDS", 2)
+    
+    response = TestClient(server.app).post("/api/movies/batch", json={"tmdb_ids": [1, 2, 3]})
+    
+    assert response.json()["error"] == "BATCH_TOO_LARGE"
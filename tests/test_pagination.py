@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from database import db_service, encode_cursor, decode_cursor
+
+
+def test_cursors_round_trip_numbers_and_datetimes():
+    doc_id = ObjectId()
+    watched_at = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    
+    assert decode_cursor(encode_cursor(87.5, doc_id)) == (87.5, doc_id)
+    assert decode_cursor(encode_cursor(watched_at, doc_id)) == (watched_at, doc_id)
+    assert "=" not in encode_cursor(watched_at, doc_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_cursor(1.0, ObjectId())[:-4]])
+def test_malformed_cursors_raise_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_cursor_pages_cover_tied_sort_keys_like_offset_pages(mongo):
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    # Popularity ties force the _id tiebreak at page boundaries
+    docs = [
+        {"tmdb_id": tmdb_id, "title": f"Title {tmdb_id}", "type": "movie", "popularity": float(tmdb_id // 3), "expires_at": expires_at}
+        for tmdb_id in range(1, 12)
+    ]
+    
+    async def scenario():
+        await mongo.movies.insert_many(docs)
+        offset_ids, cursor_ids = [], []
+        for page in range(1, 5):
+            data = await db_service.get_movies_paginated(page, 3, include_total=False)
+            offset_ids += [card.tmdb_id for card in data["results"]]
+        
+        data = await db_service.get_movies_paginated(1, 3)
+        assert (data["total_pages"], data["total_results"]) == (4, 11)
+        while True:
+            cursor_ids += [card.tmdb_id for card in data["results"]]
+            if not data["next_cursor"]:
+                break
+            data = await db_service.get_movies_paginated(limit=3, cursor=data["next_cursor"], include_total=False)
+        return offset_ids, cursor_ids
+    
+    offset_ids, cursor_ids = asyncio.run(scenario())
+    assert cursor_ids == offset_ids
+    assert sorted(cursor_ids) == list(range(1, 12))
+
+
+def test_watch_history_pages_by_datetime_cursor(mongo):
+    watched_at = datetime(2024, 5, 1)
+    
+    async def scenario():
+        await mongo.watch_history.insert_many([
+            {"username": "ana", "movie_id": str(tmdb_id), "tmdb_id": tmdb_id, "title": f"Title {tmdb_id}", "type": "movie",
+             "progress": 0.5, "watched_at": watched_at + timedelta(minutes=tmdb_id)}
+            for tmdb_id in range(1, 6)
+        ])
+        first = await db_service.get_watch_history("ana", limit=2)
+        second = await db_service.get_watch_history("ana", limit=2, cursor=first["next_cursor"])
+        return first, second
+    
+    first, second = asyncio.run(scenario())
+    assert [card.tmdb_id for card in first["results"]] == [5, 4]
+    assert [card.tmdb_id for card in second["results"]] == [3, 2]
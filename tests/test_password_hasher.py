@@ -0,0 +1,52 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from auth import PasswordHasher
+
+
+def test_saturated_pool_rejects_with_503_and_recovers():
+    hasher = PasswordHasher(workers=1, max_queue=1)
+    release = threading.Event()
+    
+    def slow_hash(password):
+        release.wait(5)
+        return f"hashed:{password}"
+    
+    async def scenario():
+        running = [asyncio.ensure_future(hasher._run("hash", slow_hash, name)) for name in ("a", "b")]
+        await asyncio.sleep(0)
+        assert hasher.pending == 2
+        
+        with pytest.raises(HTTPException) as rejected:
+            await hasher._run("hash", slow_hash, "c")
+        assert rejected.value.status_code == 503
+        assert rejected.value.headers["Retry-After"] == "1"
+        
+        release.set()
+        assert await asyncio.gather(*running) == ["hashed:a", "hashed:b"]
+        assert await hasher._run("hash", slow_hash, "d") == "hashed:d"
+    
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        hasher.shutdown()
+    assert hasher.rejected == 1
+    assert hasher.pending == 0
+
+
+def test_hash_and_verify_run_on_the_pool():
+    hasher = PasswordHasher(workers=1, max_queue=0)
+    
+    async def scenario():
+        hashed = await hasher.hash("correct horse")
+        return await hasher.verify("correct horse", hashed), await hasher.verify("wrong", hashed)
+    
+    try:
+        assert asyncio.run(scenario()) == (True, False)
+    finally:
+        hasher.shutdown()
+    assert "password_hash_rejected_total 0" in hasher.render_metrics()
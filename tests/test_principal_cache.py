@@ -0,0 +1,38 @@
+import asyncio
+import time
+from datetime import timedelta
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+import auth
+import server
+
+
+def authenticate(token, db):
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    return asyncio.run(server.get_current_user_with_db(credentials, db))
+
+
+def test_validated_tokens_skip_the_user_lookup(mongo):
+    auth.principal_cache.clear()
+    asyncio.run(mongo.users.insert_one({"username": "ana", "email": "ana@example.com"}))
+    token = auth.create_access_token({"sub": "ana"})
+    
+    assert authenticate(token, mongo).username == "ana"
+    # Served from the cache even though the user doc is gone
+    asyncio.run(mongo.users.delete_many({}))
+    assert authenticate(token, mongo).username == "ana"
+    
+    other = auth.create_access_token({"sub": "ana"}, timedelta(minutes=5))
+    assert auth.get_cached_principal(other) is None
+
+
+def test_cached_principals_never_outlive_the_token():
+    auth.principal_cache.clear()
+    user = auth.User(username="ana", email="ana@example.com")
+    
+    auth.cache_principal("expired", user, time.time() - 1)
+    auth.cache_principal("valid", user, time.time() + 3600)
+    
+    assert auth.get_cached_principal("expired") is None
+    assert auth.get_cached_principal("valid") == user
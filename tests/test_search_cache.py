@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import db_service
+from search_index import TitleIndex, SearchCache
+
+def movie_doc(tmdb_id, title, popularity=1.0, _id=None):
+    doc = {
+        "tmdb_id": tmdb_id,
+        "title": title,
+        "popularity": popularity,
+        "type": "movie",
+        "expires_at": datetime.utcnow() + timedelta(hours=24)
+    }
+    if _id:
+        doc["_id"] = _id
+    return doc
+
+@pytest.fixture
+def search(monkeypatch):
+    """A title index and search cache following db_service writes, like at startup."""
+    monkeypatch.setattr(db_service, "movie_write_hooks", [])
+    index = TitleIndex()
+    cache = SearchCache(index)
+    db_service.movie_write_hooks.append(index.add_docs)
+    cache.start()
+    db_service._notify_movie_writes([movie_doc(1, "Dark City", _id="a")])
+    return index, cache
+
+def test_merged_page_survives_the_write_of_its_results(search):
+    index, cache = search
+    tmdb_movies = [movie_doc(2, "Dark Star"), movie_doc(3, "Dark Water")]
+    page = {"page": 1, "total_pages": 1, "total_results": 3, "results": index.merge("dark", index.search("dark")["results"], tmdb_movies)}
+    cache.set("dark", 1, page)
+    
+    # What write_search_results' cache_movies_bulk passes to the hooks
+    db_service._notify_movie_writes(tmdb_movies)
+    
+    cached = cache.get("dark", 1)
+    assert cached is not None
+    assert [card.tmdb_id for card in cached["results"]] == [card.tmdb_id for card in page["results"]]
+
+def test_refreshing_an_indexed_title_keeps_cached_pages(search):
+    index, cache = search
+    cache.set("dark", 1, index.search("dark"))
+    
+    db_service._notify_movie_writes([movie_doc(1, "Dark City", popularity=5.0)])
+    
+    assert cache.get("dark", 1) is not None
+    assert cache.invalidations == 0
+
+def test_new_matching_title_drops_cached_pages(search):
+    index, cache = search
+    cache.set("dark", 1, index.search("dark"))
+    cache.set("river", 1, index.search("river"))
+    
+    db_service._notify_movie_writes([movie_doc(4, "Dark Phoenix")])
+    
+    assert cache.get("dark", 1) is None
+    assert cache.get("river", 1) is not None
+    assert {card.tmdb_id for card in index.search("dark")["results"]} == {1, 4}
+
+def test_empty_results_are_cached_by_normalized_query(search):
+    index, cache = search
+    cache.set("Zzyzx", 1, index.search("Zzyzx"))
+    
+    cached = cache.get("  ZZYZX!", 1)
+    assert cached is not None and cached["results"] == []
+    assert cache.negative_hits == 1
+
+def test_search_results_written_before_answering_carry_their_ids(mongo):
+    from server import write_search_results
+    
+    async def run():
+        # An expired doc the index doesn't hold, and a title Mongo hasn't seen
+        stale_id = (await mongo.movies.insert_one({"tmdb_id": 5, "title": "Dark Water", "expires_at": datetime.utcnow()})).inserted_id
+        # New title first: mongomock numbers upserts among upserts, not among all operations
+        tmdb_movies = [{"id": 6, "tmdb_id": 6, "title": "Dark Shadows"}, {"id": 5, "tmdb_id": 5, "title": "Dark Water"}]
+        await write_search_results(tmdb_movies)
+        return stale_id, tmdb_movies, {doc["tmdb_id"]: str(doc["_id"]) async for doc in mongo.movies.find({})}
+    
+    stale_id, tmdb_movies, stored_ids = asyncio.run(run())
+    
+    assert [movie["_id"] for movie in tmdb_movies] == [stored_ids[6], str(stale_id)]
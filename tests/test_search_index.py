@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import database
+from database import db_service
+from search_index import TitleIndex, SearchCache
+
+def movie_doc(tmdb_id, title, popularity=1.0, expires_in=timedelta(hours=24)):
+    return {"_id": str(tmdb_id), "tmdb_id": tmdb_id, "title": title, "popularity": popularity, "expires_at": datetime.utcnow() + expires_in}
+
+TITLES = ["Dark City", "Dark Star", "The Dark Knight", "Darkman", "City of God", "Star Wars", "Stardust"]
+
+def test_bulk_prefix_load_matches_incremental_adds():
+    incremental, bulk = TitleIndex(), TitleIndex()
+    for tmdb_id, title in enumerate(TITLES, 1):
+        incremental.add(movie_doc(tmdb_id, title, popularity=tmdb_id))
+        bulk.add(movie_doc(tmdb_id, title, popularity=tmdb_id), index_prefix=False)
+    bulk.prefixes.add_many(bulk.titles)
+    
+    assert bulk.prefixes.entries == incremental.prefixes.entries
+    for prefix in ("d", "dar", "star", "city", "k"):
+        assert bulk.prefixes.lookup(prefix) == incremental.prefixes.lookup(prefix)
+
+def test_bulk_prefix_load_keeps_titles_written_during_the_load():
+    index = TitleIndex()
+    index.add(movie_doc(1, "Dark City"), index_prefix=False)
+    index.suggest("dark")
+    # A write hook indexes a title while the load is still running
+    index.add(movie_doc(2, "Dark Star", popularity=5.0))
+    index.prefixes.add_many({1: index.titles[1]})
+    
+    assert [card.tmdb_id for card in index.suggest("dark")] == [2, 1]
+
+def test_deleted_movies_leave_suggestions_and_cached_pages():
+    index = TitleIndex()
+    cache = SearchCache(index)
+    index.add_docs([movie_doc(1, "Dark City"), movie_doc(2, "Dark Star")])
+    cache.set("dark", 1, index.search("dark"))
+    cache.set("star", 1, index.search("star"))
+    
+    # Movie 1 expired and was deleted; movie 2 was refreshed after the cleanup read it
+    cutoff = datetime.utcnow() + timedelta(days=2)
+    index.add(movie_doc(2, "Dark Star", expires_in=timedelta(days=3)))
+    cache.invalidate_deleted([1, 2], cutoff)
+    index.remove_deleted([1, 2], cutoff)
+    
+    assert [card.tmdb_id for card in index.suggest("dark")] == [2]
+    assert cache.get("dark", 1) is None
+    assert cache.get("star", 1) is not None
+
+def test_stale_titles_stay_searchable_until_cleanup_deletes_them(mongo, monkeypatch):
+    monkeypatch.setattr(database, "MOVIE_CACHE_MAX_STALE", timedelta(hours=72))
+    index = TitleIndex()
+    monkeypatch.setattr(db_service, "movie_delete_hooks", [index.remove_deleted])
+    docs = [
+        movie_doc(1, "Dark City", expires_in=-timedelta(hours=1)),
+        movie_doc(2, "Dark Star", expires_in=-timedelta(hours=73)),
+    ]
+    
+    async def scenario():
+        await mongo.movies.insert_many([dict(doc) for doc in docs])
+        await index.load()
+        # Only the title still inside the stale window is indexed and served
+        assert [card.tmdb_id for card in index.suggest("dark")] == [1]
+        index.add(docs[1])
+        assert [card.tmdb_id for card in index.search("dark")["results"]] == [1]
+        
+        await db_service.clear_expired_cache()
+        assert [doc["tmdb_id"] async for doc in mongo.movies.find()] == [1]
+    
+    asyncio.run(scenario())
+    assert 2 not in index.cards
+    assert [card.tmdb_id for card in index.suggest("dark")] == [1]
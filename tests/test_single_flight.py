@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from external_apis import SingleFlight
+
+
+def test_concurrent_callers_share_one_fetch():
+    flights = SingleFlight()
+    calls = []
+    
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"id": 1}
+    
+    async def scenario():
+        return await asyncio.gather(*(flights.do("movie/1", fetch) for _ in range(5)))
+    
+    results = asyncio.run(scenario())
+    assert results == [{"id": 1}] * 5
+    assert len(calls) == 1
+    assert (flights.originated, flights.coalesced) == (1, 4)
+    assert not flights.in_flight
+
+
+def test_finished_fetches_are_not_reused():
+    flights = SingleFlight()
+    calls = []
+    
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+    
+    async def scenario():
+        return [await flights.do("movie/1", fetch), await flights.do("movie/1", fetch)]
+    
+    assert asyncio.run(scenario()) == [1, 2]
+
+
+def test_failures_reach_every_waiter_and_clear_the_key():
+    flights = SingleFlight()
+    
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ConnectionError("upstream down")
+    
+    async def scenario():
+        return await asyncio.gather(*(flights.do("movie/1", fetch) for _ in range(3)), return_exceptions=True)
+    
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert not flights.in_flight
+
+
+def test_cancelled_originator_leaves_the_fetch_running_for_others():
+    flights = SingleFlight()
+    
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "sources"
+    
+    async def scenario():
+        originator = asyncio.ensure_future(flights.do("streams/1", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.do("streams/1", fetch))
+        await asyncio.sleep(0)
+        originator.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await originator
+        return await follower
+    
+    assert asyncio.run(scenario()) == "sources"
+    assert flights.originated == 1
@@ -0,0 +1,75 @@
+import asyncio
+
+import orjson
+
+import cache
+from cache import LocalCache, LocalBackend, MongoBackend, TwoTierCache
+
+
+def test_local_cache_evicts_least_recently_used_entries_by_size():
+    l1 = LocalCache(max_bytes=100)
+    l1.set("tmdb_lists", "a", "A", 40, 60)
+    l1.set("tmdb_lists", "b", "B", 40, 60)
+    assert l1.get("tmdb_lists", "a") == "A"
+    
+    l1.set("tmdb_lists", "c", "C", 40, 60)
+    assert l1.get("tmdb_lists", "b") is None
+    assert l1.get("tmdb_lists", "a") == "A"
+    assert l1.size_bytes == 80
+    
+    # Entries larger than the whole cache are never stored
+    l1.set("tmdb_lists", "huge", "H", 101, 60)
+    assert l1.get("tmdb_lists", "huge") is None
+
+
+def test_local_cache_expires_entries(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: clock[0])
+    l1 = LocalCache()
+    l1.set("streams", "key", {"sources": []}, 10, 60)
+    
+    clock[0] += 61
+    assert l1.get("streams", "key") is None
+    assert l1.size_bytes == 0
+
+
+def test_entries_are_sized_by_their_serialized_bytes():
+    tiers = TwoTierCache(LocalCache(), LocalBackend())
+    value = {"title": "Amélie", "results": [1, 2, 3]}
+    
+    asyncio.run(tiers.set("tmdb_details", "movie/194", value))
+    
+    assert tiers.l1.size_bytes == len(orjson.dumps(value))
+    assert tiers.get_local("tmdb_details", "movie/194") == value
+
+
+def test_shared_hits_fill_the_local_tier(mongo):
+    writer = TwoTierCache(LocalCache(), MongoBackend())
+    reader = TwoTierCache(LocalCache(), MongoBackend())
+    value = {"results": [{"id": 1, "title": "Heat"}]}
+    
+    async def scenario():
+        await writer.set("tmdb_lists", "movie/popular?page=1", value)
+        assert reader.get_local("tmdb_lists", "movie/popular?page=1") is None
+        assert await reader.get_shared("tmdb_lists", "movie/popular?page=1") == value
+    
+    asyncio.run(scenario())
+    assert reader.get_local("tmdb_lists", "movie/popular?page=1") == value
+
+
+def test_shared_tier_failures_are_misses():
+    class BrokenBackend:
+        async def get(self, key):
+            raise ConnectionError("down")
+        
+        async def set(self, namespace, key, data, ttl):
+            raise ConnectionError("down")
+    
+    tiers = TwoTierCache(LocalCache(), BrokenBackend())
+    
+    async def scenario():
+        await tiers.set("tmdb_lists", "key", {"results": []})
+        assert await tiers.get_shared("tmdb_lists", "other") is None
+    
+    asyncio.run(scenario())
+    assert tiers.get_local("tmdb_lists", "key") == {"results": []}
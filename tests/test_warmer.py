@@ -0,0 +1,58 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import warmer
+from warmer import CacheWarmer, WARMER_LEASE_ID
+
+
+def test_only_one_worker_claims_each_cycle(mongo):
+    first, second = CacheWarmer(), CacheWarmer()
+    
+    async def scenario():
+        assert await first._claim_cycle()
+        assert not await second._claim_cycle()
+        
+        # Once the lease runs out the next claim goes through
+        await mongo.leases.update_one({"_id": WARMER_LEASE_ID}, {"$set": {"expires_at": datetime.utcnow()}})
+        assert await second._claim_cycle()
+        assert (await mongo.leases.find_one({"_id": WARMER_LEASE_ID}))["holder"] == second.worker_id
+    
+    asyncio.run(scenario())
+
+
+def test_holder_extends_its_lease_during_a_long_cycle(mongo):
+    holder = CacheWarmer()
+    
+    async def scenario():
+        assert await holder._claim_cycle()
+        holder.lease_expires_at = datetime.utcnow()
+        assert await holder._extend_lease()
+        lease = await mongo.leases.find_one({"_id": WARMER_LEASE_ID})
+        assert lease["expires_at"] > datetime.utcnow() + timedelta(seconds=warmer.WARMER_INTERVAL_SECONDS / 2)
+    
+    asyncio.run(scenario())
+
+
+def test_cycle_stops_once_another_worker_takes_the_lease(mongo, monkeypatch):
+    fetched = []
+    
+    async def resolve(tmdb_id, refresh=False, before_fetch=None):
+        fetched.append(tmdb_id)
+        return None
+    
+    monkeypatch.setattr(warmer, "resolve_movie_metadata", resolve)
+    slow, other = CacheWarmer(), CacheWarmer()
+    
+    async def scenario():
+        assert await slow._claim_cycle()
+        # The slow worker's lease lapses and another worker starts a cycle
+        await mongo.leases.update_one({"_id": WARMER_LEASE_ID}, {"$set": {"expires_at": datetime.utcnow()}})
+        assert await other._claim_cycle()
+        slow.lease_expires_at = datetime.utcnow()
+        
+        await slow._warm_movies([{"tmdb_id": 1}, {"tmdb_id": 2}])
+        assert not await slow._extend_lease()
+    
+    asyncio.run(scenario())
+    assert fetched == []
+    assert slow.lost_leases == 1